@@ -0,0 +1,232 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import price_store
+from crop_registry import get_crop_files
+from forecast_cache import load_forecast, save_forecast
+from price_store import crop_name_of, load_partition
+
+# Rolling-origin backtests of candidate SARIMA orders per crop (and optionally per
+# crop x market). The best candidate by mean MAPE is saved to the selection file, which
+# production forecasts read instead of choosing orders from the series length.
+# Usage: python backtest.py --workers 8 --per-market
+
+selection_file = os.environ.get("MODEL_SELECTION_FILE", os.path.join("cache", "model_selection.json"))
+
+# Candidate (order, seasonal_order) pairs; the first two are the length-based defaults
+candidates = [
+    ((2, 1, 2), (1, 1, 1, 12)),
+    ((1, 1, 1), (1, 0, 0, 12)),
+    ((1, 1, 1), (0, 1, 1, 12)),
+    ((0, 1, 1), (0, 1, 1, 12)),
+    ((1, 1, 0), (1, 1, 0, 12)),
+    ((1, 1, 1), (0, 0, 0, 0)),
+]
+
+all_markets = "All Markets"
+min_train_months = 24
+
+
+def default_orders(n_months):
+    # Length-based rule used when no backtested selection exists
+    if n_months > 36:
+        return (2, 1, 2), (1, 1, 1, 12)
+    return (1, 1, 1), (1, 0, 0, 12)
+
+
+def rolling_origins(n_months, origins, step, horizon):
+    # Training lengths for each origin, latest first; every origin leaves `horizon` months to score
+    cuts = [n_months - horizon - i * step for i in range(origins)]
+    return [cut for cut in cuts if cut >= min_train_months]
+
+
+def _fold_key(monthly, market, order, seasonal_order, cut, horizon):
+    # Keyed on the months the fold actually uses, so new data only invalidates the folds
+    # whose window it falls into
+    window = monthly.iloc[:cut + horizon]
+    digest = hashlib.sha1(np.asarray(window.index.asi8).tobytes())
+    digest.update(np.asarray(window.values, dtype=np.float64).tobytes())
+    raw = repr(('backtest', digest.hexdigest(), market, tuple(order), tuple(seasonal_order), cut, horizon))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def run_fold(monthly, market, order, seasonal_order, cut, horizon):
+    # Fit on the first `cut` months and score the next `horizon`; fold results are cached
+    # on disk, so re-running after adding candidates or data only fits what is new
+    key = _fold_key(monthly, market, order, seasonal_order, cut, horizon)
+    result = load_forecast(key)
+    if result is None:
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+        train = monthly.iloc[:cut]
+        actual = monthly.iloc[cut:cut + horizon].values
+        start = time.perf_counter()
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                model = SARIMAX(train, order=order, seasonal_order=seasonal_order,
+                                enforce_stationarity=False, enforce_invertibility=False)
+                predicted = model.fit(disp=False).forecast(steps=horizon).values
+        except Exception as e:
+            print(f"Backtest fit failed for {order}x{seasonal_order}: {e}")
+            predicted = np.full(horizon, np.nan)
+        fit_seconds = time.perf_counter() - start
+
+        mask = ~np.isnan(actual) & ~np.isnan(predicted) & (actual != 0)
+        if mask.any():
+            errors = predicted[mask] - actual[mask]
+            mape = float(np.mean(np.abs(errors / actual[mask])) * 100)
+            rmse = float(np.sqrt(np.mean(errors ** 2)))
+        else:
+            mape = rmse = np.nan
+        result = {'mape': mape, 'rmse': rmse, 'fit_seconds': fit_seconds}
+        save_forecast(key, result)
+    return result
+
+
+def _run_fold_task(task):
+    crop, market, monthly, order, seasonal_order, cut, horizon = task
+    return (crop, market, order, seasonal_order, cut), run_fold(monthly, market, order, seasonal_order, cut, horizon)
+
+
+def series_to_backtest(crop_files, data_dir, per_market=False):
+    # (crop, market, monthly series) for every crop (and crop x market)
+    for crop_file in crop_files:
+        partition = load_partition(crop_file, data_dir)
+        markets = [None] + (list(partition.markets) if per_market else [])
+        for market in markets:
+            stats = partition.stats(market)
+            if stats is None or stats.count == 0:
+                continue
+            yield crop_name_of(crop_file), market, stats.monthly_series()
+
+
+def run_backtests(crop_files, data_dir=None, per_market=False, origins=3, step=6, horizon=12, workers=None):
+    # Returns a DataFrame with one row per (crop, market, candidate): mean MAPE/RMSE/fit time
+    data_dir = data_dir or price_store.data_dir
+    tasks = []
+    for crop, market, monthly in series_to_backtest(crop_files, data_dir, per_market):
+        cuts = rolling_origins(len(monthly), origins, step, horizon)
+        if not cuts:
+            print(f"Skipping {crop} ({market or all_markets}): only {len(monthly)} months")
+            continue
+        for order, seasonal_order in candidates:
+            for cut in cuts:
+                tasks.append((crop, market, monthly, order, seasonal_order, cut, horizon))
+
+    print(f"Running {len(tasks)} backtest folds...")
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        results = [_run_fold_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_run_fold_task, tasks, chunksize=4))
+
+    rows = []
+    for (crop, market, order, seasonal_order, cut), fold in results:
+        rows.append({
+            'crop': crop,
+            'market': market or all_markets,
+            'order': tuple(order),
+            'seasonal_order': tuple(seasonal_order),
+            'origin': cut,
+            **fold,
+        })
+    folds = pd.DataFrame(rows)
+    if folds.empty:
+        return folds
+    return (folds.groupby(['crop', 'market', 'order', 'seasonal_order'], sort=False)
+            .agg(mape=('mape', 'mean'), rmse=('rmse', 'mean'), fit_seconds=('fit_seconds', 'mean'),
+                 origins=('origin', 'count'))
+            .reset_index())
+
+
+def select_winners(summary):
+    # Lowest mean MAPE per series, ties broken by fit time; candidates failing every fold are skipped
+    selection = {}
+    scored = summary.dropna(subset=['mape']).sort_values(['mape', 'fit_seconds'])
+    for (crop, market), group in scored.groupby(['crop', 'market'], sort=False):
+        best = group.iloc[0]
+        selection.setdefault(crop, {})[market] = {
+            'order': list(best['order']),
+            'seasonal_order': list(best['seasonal_order']),
+            'mape': round(float(best['mape']), 4),
+            'rmse': round(float(best['rmse']), 4),
+            'fit_seconds': round(float(best['fit_seconds']), 4),
+        }
+    return selection
+
+
+def save_selection(selection, path=None):
+    path = path or selection_file
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(selection, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+_selection = {'stamp': None, 'data': {}}
+_selection_lock = threading.Lock()
+
+
+def load_selection(path=None):
+    # Selection file contents, re-read only when the file changes
+    path = path or selection_file
+    try:
+        stamp = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    with _selection_lock:
+        if _selection['stamp'] != (path, stamp):
+            with open(path) as f:
+                _selection['data'] = json.load(f)
+            _selection['stamp'] = (path, stamp)
+        return _selection['data']
+
+
+def selected_orders(crop, market, n_months):
+    # Backtested orders for the series, else the length-based rule. A crop's all-markets
+    # winner is not reused for a single market, whose series is usually much shorter
+    choice = load_selection().get(crop, {}).get(market or all_markets)
+    if choice is None:
+        return default_orders(n_months)
+    return tuple(choice['order']), tuple(choice['seasonal_order'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backtest candidate SARIMA orders and save the best per crop")
+    parser.add_argument("crops", nargs="*", help="crop CSV file names (default: every registered crop)")
+    parser.add_argument("--data-dir", default=price_store.data_dir)
+    parser.add_argument("--registry", default=os.environ.get("CROP_REGISTRY", "crop_registry.txt"))
+    parser.add_argument("--per-market", action="store_true", help="also select orders per crop x market")
+    parser.add_argument("--origins", type=int, default=3, help="number of rolling origins")
+    parser.add_argument("--step", type=int, default=6, help="months between origins")
+    parser.add_argument("--horizon", type=int, default=12, help="months scored after each origin")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default=selection_file)
+    args = parser.parse_args()
+
+    crop_files = args.crops or get_crop_files(args.data_dir, args.registry)
+    summary = run_backtests(crop_files, args.data_dir, args.per_market, args.origins, args.step,
+                            args.horizon, args.workers)
+    if summary.empty:
+        print("Nothing to backtest")
+    else:
+        os.makedirs("output", exist_ok=True)
+        summary.to_csv(os.path.join("output", "backtest_results.csv"), index=False)
+        selection = select_winners(summary)
+        save_selection(selection, args.output)
+        print(summary.sort_values(['crop', 'market', 'mape']).to_string(index=False))
+        print(f"\nSaved selections for {len(selection)} crops to {args.output}")
@@ -0,0 +1,54 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geodata import build_lstm, forecast_sequences, predict_loop
+
+# Micro-benchmark of the weather LSTM rollout: the original loop (one Keras predict() and
+# np.append per step) against the traced step function over a preallocated window buffer,
+# for one window and for batches of windows rolled out together. Models are untrained,
+# which does not change the cost of a step.
+# Run from the Backend directory: python benchmarks/bench_lstm_inference.py --steps 120,180
+
+
+def timed(fn, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark autoregressive LSTM inference")
+    parser.add_argument("--steps", default="120,180", help="comma separated forecast lengths")
+    parser.add_argument("--batches", default="1,16,64", help="comma separated numbers of windows")
+    parser.add_argument("--seq-length", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'features':>8}{'steps':>7}{'batch':>7}{'predict loop':>14}{'fast':>10}{'speedup':>9}{'max diff':>10}")
+    for n_features in (1, 3):
+        model = build_lstm(args.seq_length, n_features)
+        for steps in [int(v) for v in args.steps.split(",")]:
+            for batch in [int(v) for v in args.batches.split(",")]:
+                windows = rng.random((batch, args.seq_length, n_features))
+                # The original loop handles one window per rollout
+                loop_seconds, loop = timed(
+                    lambda: np.stack([predict_loop(model, window, steps) for window in windows]), 1)
+                forecast_sequences(model, windows, steps)  # trace outside the timing
+                fast_seconds, fast = timed(lambda: forecast_sequences(model, windows, steps), args.repeat)
+                diff = float(np.max(np.abs(loop - fast)))
+                print(f"{n_features:>8}{steps:>7}{batch:>7}{loop_seconds:>14.3f}{fast_seconds:>10.3f}"
+                      f"{loop_seconds / fast_seconds:>8.1f}x{diff:>10.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from generate_market_data import generate
+
+# Stage-by-stage benchmark of the market analysis pipeline on synthetic data. Each scale
+# (markets x years) is generated into a temporary directory and measured in a fresh
+# process, so caches and peak RSS never carry over between scales.
+# Usage: python benchmarks/bench_pipeline.py --scales 20x5,200x10 --crops 10
+
+
+class StageTimer:
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.rows = []
+
+    def run(self, name, fn, items=None, unit="rows"):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        error = ""
+        try:
+            result = fn()
+        except Exception as e:
+            # A failing stage is reported rather than aborting the remaining stages
+            result = None
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - start
+        peak = None
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.rows.append({
+            'stage': name,
+            'seconds': elapsed,
+            'items': items,
+            'throughput': f"{items / elapsed:,.0f} {unit}/s" if items and elapsed > 0 else "",
+            'peak_mb': peak / 2 ** 20 if peak is not None else np.nan,
+            'error': error,
+        })
+        return result
+
+
+def run_scale(out_dir, files, n_rows, fit_series, closest_queries, workers, trace_memory):
+    os.chdir(out_dir)
+    os.environ["MARKET_ANALYSIS_WORKERS"] = str(workers)
+    import charts
+    import market_flask as m
+    from fast_forecast import batch_forecast
+    from market_index import get_market_index
+    from price_store import ingest_crop, parse_dates, date_column
+
+    # After the imports, since statsmodels installs its own warning filters
+    warnings.simplefilter("ignore")
+    m.crop_files = files
+    timer = StageTimer(trace_memory)
+
+    # Raw CSV handling, as done at ingest
+    frames = timer.run("load", lambda: [pd.read_csv(os.path.join(m.directory, f)) for f in files], n_rows)
+    timer.run("date parse", lambda: [parse_dates(df[date_column], f) for f, df in zip(files, frames)], n_rows)
+    del frames
+    timer.run("ingest", lambda: [ingest_crop(f) for f in files], n_rows)
+
+    index = get_market_index(m.market_lat_long_file)
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(8.0, 32.0, closest_queries)
+    lons = rng.uniform(69.0, 89.0, closest_queries)
+    timer.run("closest market", lambda: [m.get_closest_market(lat, lon) for lat, lon in zip(lats, lons)],
+              closest_queries, "queries")
+    timer.run("closest market (batch)", lambda: index.nearest_many(lats, lons), closest_queries, "queries")
+
+    market = m.analysis_market(m.get_closest_market(lats[0], lons[0]))
+    markets = [None] + list(dict.fromkeys(index.names[:4]))
+    stat_records = timer.run(
+        "stats",
+        lambda: [m.analyze_crop(f, mk, mode='fast') for mk in markets for f in files],
+        len(markets) * len(files), "series")
+    stat_records = [r for r in stat_records or [] if r is not None]
+
+    fit_records = stat_records[:fit_series]
+    fits = timer.run(
+        "fit (sarimax)",
+        lambda: [m.fit_sarimax(r, (2, 1, 2), (1, 1, 1, 12)) for r in fit_records],
+        len(fit_records), "series")
+    timer.run("forecast (sarimax)", lambda: [fit.forecast(steps=m.forecast_steps) for fit in fits or []],
+              len(fits), "series")
+    timer.run("forecast (fast)",
+              lambda: batch_forecast([r['monthly'] for r in stat_records], m.forecast_steps),
+              len(stat_records), "series")
+
+    records = m.run_crop_analyses(files, market, 'fast')
+    summary_df, price_change_data, all_crops_forecast = m.summarize_records(records)
+    plots = []
+    if all_crops_forecast:
+        plots = [
+            (charts.plot_price_comparison, (summary_df,), 'price_comparison'),
+            (charts.plot_price_trends, (price_change_data,), 'price_trends'),
+            (charts.plot_comparative_forecast, (summary_df, all_crops_forecast), 'comparative_forecast'),
+        ]
+    else:
+        print("No forecasts at this scale (too little usable data), skipping the plot stage")
+    timer.run("plot", lambda: [charts.render_chart(plot, args, *charts.chart_sizes[name], charts.default_dpi, 'png')
+                               for plot, args, name in plots], len(plots), "charts")
+    timer.run("serialize", lambda: m.app.json.dumps(m.market_report(market, records)), 1, "reports")
+
+    timer.run("get_market (fast)", lambda: m.get_market(lats[0], lons[0], 'fast'), 1, "requests")
+    timer.run("get_market (sarimax)", lambda: m.get_market(lats[0], lons[0], 'sarimax'), 1, "requests")
+    timer.run("get_market (cached)", lambda: m.get_market(lats[0], lons[0], 'sarimax'), 1, "requests")
+
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return timer.rows, max_rss_mb
+
+
+def parse_scales(text):
+    scales = []
+    for part in text.split(","):
+        markets, years = part.lower().split("x")
+        scales.append((int(markets), int(years)))
+    return scales
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the market analysis pipeline on synthetic data")
+    parser.add_argument("--scales", default="20x5,100x10", help="comma separated MARKETSxYEARS")
+    parser.add_argument("--crops", type=int, default=10)
+    parser.add_argument("--dirty-dates", type=float, default=0.0)
+    parser.add_argument("--missing-prices", type=float, default=0.01)
+    parser.add_argument("--fit-series", type=int, default=10, help="number of series fitted with SARIMAX")
+    parser.add_argument("--closest-queries", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=1, help="MARKET_ANALYSIS_WORKERS for get_market")
+    parser.add_argument("--no-trace-memory", action="store_true", help="skip tracemalloc (faster, no per-stage peaks)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated data directories")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    for n_markets, years in parse_scales(args.scales):
+        out_dir = tempfile.mkdtemp(prefix=f"market_bench_{n_markets}x{years}_")
+        try:
+            start = time.perf_counter()
+            files, n_rows = generate(out_dir, args.crops, n_markets, years, dirty_dates=args.dirty_dates,
+                                     missing_prices=args.missing_prices)
+            print(f"\n== {args.crops} crops x {n_markets} markets x {years} years: {n_rows:,} rows "
+                  f"(generated in {time.perf_counter() - start:.1f}s, {out_dir})")
+            with ctx.Pool(1) as pool:
+                rows, max_rss_mb = pool.apply(run_scale, (out_dir, files, n_rows, args.fit_series,
+                                                          args.closest_queries, args.workers,
+                                                          not args.no_trace_memory))
+            report = pd.DataFrame(rows)
+            if not report['error'].any():
+                report = report.drop(columns='error')
+            print(report.to_string(index=False, formatters={
+                'seconds': '{:.3f}'.format, 'peak_mb': '{:.1f}'.format,
+                'items': lambda v: '' if v is None or pd.isna(v) else f"{int(v):,}"}))
+            print(f"Peak RSS: {max_rss_mb:.0f} MB")
+        finally:
+            if not args.keep:
+                shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Cold start of each Flask app module: import time and peak RSS of a fresh interpreter
+# importing it, plus the heavy libraries left loaded afterwards.
+# Run from the Backend directory: python benchmarks/bench_startup.py --repeat 3
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+heavy_modules = ["tensorflow", "sklearn", "statsmodels", "matplotlib", "seaborn", "plotly", "scipy",
+                 "rasterio", "pyproj"]
+
+probe = """
+import json, resource, sys, time
+sys.path.insert(0, {backend_dir!r})
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': seconds,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'loaded': [name for name in {heavy_modules!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(module):
+    code = probe.format(backend_dir=backend_dir, module=module, heavy_modules=heavy_modules)
+    env = {**os.environ, 'TF_CPP_MIN_LOG_LEVEL': '3'}
+    output = subprocess.run([sys.executable, "-W", "ignore", "-c", code], capture_output=True, text=True,
+                            check=True, env=env).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import time and memory")
+    parser.add_argument("modules", nargs="*", default=["geodata", "market_flask"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'module':>14}{'seconds':>10}{'RSS MB':>9}  heavy libraries loaded")
+    for module in args.modules:
+        runs = [measure(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda run: run['seconds'])
+        print(f"{module:>14}{best['seconds']:>10.2f}{best['rss_mb']:>9.0f}  {', '.join(best['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
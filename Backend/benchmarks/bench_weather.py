@@ -0,0 +1,99 @@
+import argparse
+import datetime
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local stand-in for the Open-Meteo archive API (synthetic daily data with a configurable
+# per-request latency and failure rate), and a benchmark of the weather fetch layer
+# against it. Run the stand-in alone with --serve and point WEATHER_API_URL at it.
+# Usage: python benchmarks/bench_weather.py --latency 1.5 --chunk-years 1,5
+
+stand_in = Flask(__name__)
+stand_in.config['latency'] = 0.0
+stand_in.config['failure_rate'] = 0.0
+stand_in.config['requests'] = 0
+_rng = np.random.default_rng(0)
+
+
+@stand_in.route('/v1/archive', methods=['GET'])
+def archive():
+    stand_in.config['requests'] += 1
+    time.sleep(stand_in.config['latency'])
+    if _rng.random() < stand_in.config['failure_rate']:
+        return jsonify({"error": True, "reason": "Simulated failure"}), 503
+    start = pd.Timestamp(request.args['start_date'])
+    end = pd.Timestamp(request.args['end_date'])
+    days = pd.date_range(start, end, freq='D')
+    lat = float(request.args['latitude'])
+    season = np.sin(2 * np.pi * days.dayofyear.values / 365.25)
+    temp_max = 32 + 6 * season + lat * 0.01
+    return jsonify({
+        "daily": {
+            "time": days.strftime("%Y-%m-%d").tolist(),
+            "temperature_2m_max": np.round(temp_max, 1).tolist(),
+            "temperature_2m_min": np.round(temp_max - 10, 1).tolist(),
+            "precipitation_sum": np.round(np.clip(season * 8, 0, None), 1).tolist(),
+            "relative_humidity_2m_mean": np.round(60 + 20 * season).tolist(),
+        }
+    })
+
+
+def start_stand_in(port=0):
+    server = make_server("127.0.0.1", port, stand_in, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1/archive"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark weather fetching against a local stand-in API")
+    parser.add_argument("--serve", action="store_true", help="only run the stand-in server")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds per stand-in response")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of 503 responses")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--chunk-years", default="1,5", help="comma separated WEATHER_CHUNK_YEARS values")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    stand_in.config['latency'] = args.latency
+    stand_in.config['failure_rate'] = args.failure_rate
+    if args.serve:
+        stand_in.run(port=args.port or 8090, threaded=True)
+        return
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server, url = start_stand_in(args.port)
+    os.environ["WEATHER_API_URL"] = url
+    os.environ["WEATHER_CONCURRENCY"] = str(args.concurrency)
+    import weather_client
+
+    end = datetime.date.today() - datetime.timedelta(days=5)
+    start = end.replace(year=end.year - args.years, day=min(end.day, 28))
+    print(f"Stand-in at {url}, {args.latency}s latency, {args.failure_rate:.0%} failures")
+    # The serial baseline is the old loop: one request per year plus a 2 s sleep in between
+    serial = args.years * args.latency + (args.years - 1) * 2
+    print(f"{'chunk years':>12}{'requests':>10}{'seconds':>10}{'days':>8}")
+    print(f"{'(old serial)':>12}{args.years:>10}{serial:>10.2f}{'':>8}")
+    for chunk_years in [int(v) for v in args.chunk_years.split(",")]:
+        weather_client.weather_chunk_years = chunk_years
+        stand_in.config['requests'] = 0
+        started = time.perf_counter()
+        chunks = weather_client.fetch_range(20.0, 79.0, start, end)
+        elapsed = time.perf_counter() - started
+        days = sum(len(daily["time"]) for daily in chunks if daily is not None)
+        print(f"{chunk_years:>12}{stand_in.config['requests']:>10}{elapsed:>10.2f}{days:>8}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
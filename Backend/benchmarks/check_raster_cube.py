@@ -0,0 +1,109 @@
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Consistency check of the raster cube against per-layer reads, on synthetic rasters with
+# mixed CRSs, dtypes, nodata and extents that are offset from each other by whole cells.
+# Layers in the cube's CRS must match get_raster_values exactly at every point; layers
+# reprojected from another CRS are reported only, as nearest resampling can pick a
+# neighbouring source pixel near cell edges.
+# Run from the Backend directory: python benchmarks/check_raster_cube.py --points 500
+
+work_dir = tempfile.mkdtemp(prefix="raster_cube_check_")
+os.environ["RASTER_STATS_DIR"] = os.path.join(work_dir, "stats")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rasterio
+from rasterio.transform import from_origin
+
+from raster_cube import RasterCube, build_cube
+from raster_layers import registry
+
+cube_crs = "EPSG:32643"
+origin_x, origin_y, cell = 500000.0, 2000000.0, 1000.0
+
+# File name -> (CRS, dtype, cell offset (x, y) from the origin, rows, cols)
+layers = {
+    'fsalt.tif': (cube_crs, 'int16', (0, 0), 60, 60),
+    'ffallow_2020.tif': (cube_crs, 'uint8', (7, 3), 40, 50),
+    'fkharif_2020.tif': (cube_crs, 'int32', (-4, -6), 55, 45),
+    'meanticd.tif': (cube_crs, 'float32', (-5, 2), 50, 70),
+    'rootsm_2020.tif': ("EPSG:4326", 'float32', None, 50, 50),
+    'fnsa_2020.tif': ("EPSG:4326", 'int16', None, 40, 40),
+}
+
+
+def write_layers(folder, rng):
+    for file_name, (crs, dtype, offset, height, width) in layers.items():
+        if crs == cube_crs:
+            transform = from_origin(origin_x + offset[0] * cell, origin_y - offset[1] * cell, cell, cell)
+        else:
+            # About 0.01 degree cells over the same area
+            transform = from_origin(75.05, 18.1, 0.011, 0.011)
+        if np.dtype(dtype).kind == 'f':
+            data = (rng.random((height, width)) * 100).astype(dtype)
+            nodata = -9999.0
+        else:
+            data = rng.integers(0, 200, (height, width)).astype(dtype)
+            nodata = 255 if dtype == 'uint8' else -1
+        data[rng.random((height, width)) < 0.05] = nodata
+        with rasterio.open(os.path.join(folder, file_name), "w", driver="GTiff", height=height, width=width,
+                           count=1, dtype=dtype, crs=crs, transform=transform, nodata=nodata) as dst:
+            dst.write(data, 1)
+
+
+def layer_value(layer, lat, lon):
+    # get_raster_values for one layer, NaN outside it
+    try:
+        return float(round(layer.value_at(lat, lon), 2))
+    except IndexError:
+        return float('nan')
+
+
+def same(a, b):
+    return a == b or (np.isnan(a) and np.isnan(b))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check raster cube values against per-layer reads")
+    parser.add_argument("--points", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    folder = os.path.join(work_dir, "gis_data")
+    os.makedirs(folder)
+    write_layers(folder, rng)
+    cube = RasterCube(build_cube(folder, os.path.join(work_dir, "cube"), cube_crs))
+
+    paths = registry.paths(folder)
+    layer_list = [registry.get(path, cube_crs) for path in paths]
+    lats = rng.uniform(17.5, 18.2, args.points)
+    lons = rng.uniform(74.9, 75.7, args.points)
+    many = {name: np.round(values, 2).tolist() for name, values in cube.values_at_many(lats, lons).items()}
+
+    failed = False
+    print(f"{'layer':>28}{'crs':>12}{'dtype':>9}{'mismatches':>12}")
+    for layer in layer_list:
+        mismatches = 0
+        for i, (lat, lon) in enumerate(zip(lats, lons)):
+            expected = layer_value(layer, lat, lon)
+            try:
+                single = cube.values_at(lat, lon)[layer.name]
+            except IndexError:
+                single = float('nan')
+            if not (same(single, expected) and same(many[layer.name][i], expected)):
+                mismatches += 1
+        exact = layer.crs == cube.crs
+        failed |= exact and mismatches > 0
+        print(f"{layer.name:>28}{layer.crs.to_string():>12}{str(layer.dtype):>9}{mismatches:>12}"
+              f"{'' if exact else '  (reprojected, not checked)'}")
+    print("FAILED" if failed else "OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
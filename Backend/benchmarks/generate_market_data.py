@@ -0,0 +1,109 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Writes synthetic Agmarknet-style price data: one CSV per crop with
+# "Market Name, Reported Date, Modal Price (Rs./Quintal)" rows, plus market_lat_long.csv.
+# Usage: python benchmarks/generate_market_data.py --out /tmp/bench --markets 200 --years 10
+
+default_crops = [
+    "Wheat", "Tomato", "Rice", "Potato", "Beans",
+    "Onion", "Masur Dal", "Maize", "Bajra(Pearl Millet-Cumbu)", "Ajwan"
+]
+
+# Formats the pipeline's date parser falls back to, used for the "dirty" dates
+dirty_date_formats = ["%d-%m-%Y", "%Y-%m-%d", "%m/%d/%Y"]
+
+
+def crop_names(n_crops):
+    names = default_crops[:n_crops]
+    names += [f"Synthetic Crop {i}" for i in range(len(names) + 1, n_crops + 1)]
+    return names
+
+
+def market_names(n_markets):
+    return [f"Market {i:05d}" for i in range(1, n_markets + 1)]
+
+
+def write_market_locations(path, markets, rng, missing_rate=0.05):
+    # Markets scattered over India's bounding box; a few without coordinates, as in the real file
+    lats = rng.uniform(8.0, 32.0, len(markets)).round(7)
+    lons = rng.uniform(69.0, 89.0, len(markets)).round(7)
+    df = pd.DataFrame({'Market Name': markets, 'Latitude': lats, 'Longitude': lons})
+    missing = rng.random(len(markets)) < missing_rate
+    df.loc[missing, ['Latitude', 'Longitude']] = np.nan
+    df.to_csv(path, index=False)
+
+
+def crop_frame(markets, start, end, rng, report_rate=0.4, dirty_dates=0.0, missing_prices=0.0):
+    days = pd.date_range(start=start, end=end, freq='D')
+    base_price = rng.uniform(800, 8000)
+    n_days = len(days)
+
+    # Each market reports on a random subset of days
+    reported = rng.random((len(markets), n_days)) < report_rate
+    market_idx, day_idx = np.nonzero(reported)
+
+    # Price = crop level * market premium * yearly seasonality * per-market random walk * noise
+    premium = rng.uniform(0.85, 1.15, len(markets))
+    phase = rng.uniform(0, 2 * np.pi)
+    season = 1 + 0.1 * np.sin(2 * np.pi * days.dayofyear.values / 365.25 + phase)
+    drift = np.exp(np.cumsum(rng.normal(0.0002, 0.01, (len(markets), n_days)), axis=1))
+    noise = rng.normal(1, 0.02, len(market_idx))
+    prices = base_price * premium[market_idx] * season[day_idx] * drift[market_idx, day_idx] * noise
+    prices = np.round(prices).astype(object)
+
+    dates = days[day_idx].strftime("%d %b %Y").values.astype(object)
+    if dirty_dates > 0:
+        dirty = np.nonzero(rng.random(len(dates)) < dirty_dates)[0]
+        formats = rng.integers(0, len(dirty_date_formats), len(dirty))
+        for i, fmt in zip(dirty, formats):
+            dates[i] = days[day_idx[i]].strftime(dirty_date_formats[fmt])
+    if missing_prices > 0:
+        prices[rng.random(len(prices)) < missing_prices] = ""
+
+    return pd.DataFrame({
+        'Market Name': np.asarray(markets, dtype=object)[market_idx],
+        'Reported Date': dates,
+        'Modal Price (Rs./Quintal)': prices,
+    })
+
+
+def generate(out_dir, n_crops=10, n_markets=20, years=5, start_year=2019, report_rate=0.4,
+             dirty_dates=0.0, missing_prices=0.0, seed=0):
+    # Returns (crop file names, total rows written)
+    rng = np.random.default_rng(seed)
+    data_dir = os.path.join(out_dir, "market_data")
+    os.makedirs(data_dir, exist_ok=True)
+    markets = market_names(n_markets)
+    write_market_locations(os.path.join(out_dir, "market_lat_long.csv"), markets, rng)
+
+    start = pd.Timestamp(year=start_year, month=1, day=1)
+    end = pd.Timestamp(year=start_year + years, month=1, day=1) - pd.Timedelta(days=1)
+    files = []
+    total_rows = 0
+    for crop in crop_names(n_crops):
+        df = crop_frame(markets, start, end, rng, report_rate, dirty_dates, missing_prices)
+        df.to_csv(os.path.join(data_dir, f"{crop}.csv"), index=False)
+        files.append(f"{crop}.csv")
+        total_rows += len(df)
+    return files, total_rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic Agmarknet-style crop price CSVs")
+    parser.add_argument("--out", required=True, help="output directory (market_data/ and market_lat_long.csv)")
+    parser.add_argument("--crops", type=int, default=10)
+    parser.add_argument("--markets", type=int, default=20)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--start-year", type=int, default=2019)
+    parser.add_argument("--report-rate", type=float, default=0.4, help="fraction of days each market reports")
+    parser.add_argument("--dirty-dates", type=float, default=0.0, help="fraction of dates in an alternative format")
+    parser.add_argument("--missing-prices", type=float, default=0.0, help="fraction of rows without a price")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    files, rows = generate(args.out, args.crops, args.markets, args.years, args.start_year, args.report_rate,
+                           args.dirty_dates, args.missing_prices, args.seed)
+    print(f"Wrote {rows} rows for {len(files)} crops to {os.path.join(args.out, 'market_data')}")
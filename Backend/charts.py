@@ -0,0 +1,181 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+import pandas as pd
+
+# Rendered charts, keyed on the fingerprint of the data they were drawn from
+chart_cache_dir = os.environ.get("CHART_CACHE_DIR", os.path.join("cache", "charts"))
+
+chart_formats = {'png': 'image/png', 'svg': 'image/svg+xml'}
+default_dpi = 100
+max_dpi = 300
+max_inches = 30
+
+_style_lock = threading.Lock()
+_styled = False
+
+
+def _setup_matplotlib():
+    # matplotlib and seaborn are imported on the first render rather than at startup
+    global _styled
+    with _style_lock:
+        if not _styled:
+            import matplotlib
+            matplotlib.use('Agg')  # Use non-interactive backend to prevent GUI errors
+            import matplotlib.pyplot as plt
+            import seaborn as sns
+
+            # Set plot style for better visualization
+            plt.style.use('ggplot')
+            sns.set_palette("Set2")
+            _styled = True
+
+
+def plot_crop_forecast(fig, record):
+    crop_name = record['crop']
+    history = record['history']
+    future_dates = record['forecast']['dates']
+    forecast = record['forecast']['prices']
+    current_price = record['forecast']['current_price']
+    one_year_price = forecast.iloc[-1]
+    long_term_change = ((one_year_price - current_price) / current_price) * 100
+
+    ax = fig.subplots()
+    ax.plot(history.index, history, label="Historical Prices", color="#1f77b4", alpha=0.7)
+    ax.plot(future_dates, forecast, label="Forecasted Prices", color="#d62728", linestyle="dashed", linewidth=2)
+    confidence = 0.15
+    ax.fill_between(future_dates, forecast * (1 - confidence), forecast * (1 + confidence),
+                    color="#d62728", alpha=0.2, label="Forecast Range (±15%)")
+    ax.set_xlabel("Date", fontsize=12)
+    ax.set_ylabel("Price (Rs./Quintal)", fontsize=12)
+    ax.set_title(f"{crop_name} Price History and Forecast", fontsize=14, fontweight='bold')
+    ax.grid(True, alpha=0.3)
+    ax.legend(loc="best")
+    fig.autofmt_xdate()
+    ax.annotate(f"Current: ₹{current_price:.0f}",
+                xy=(history.index[-1], current_price),
+                xytext=(10, 20), textcoords="offset points",
+                arrowprops=dict(arrowstyle="->", connectionstyle="arc3,rad=.2"))
+    ax.annotate(f"Forecast (1 yr): ₹{one_year_price:.0f} ({long_term_change:+.1f}%)",
+                xy=(future_dates[-1], one_year_price),
+                xytext=(10, -30), textcoords="offset points",
+                arrowprops=dict(arrowstyle="->", connectionstyle="arc3,rad=.2"))
+
+
+def _rotate_xticks(ax):
+    ax.tick_params(axis='x', labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+
+
+def plot_price_comparison(fig, summary_df):
+    ax = fig.subplots()
+    viz_df = summary_df[["Crop", "Current Price", "Forecasted Price (Next Month)"]]
+    viz_df = viz_df.sort_values(by="Current Price", ascending=False)
+    viz_df.plot(x="Crop", y=["Current Price", "Forecasted Price (Next Month)"],
+                kind="bar", color=["#1f77b4", "#d62728"], alpha=0.7, ax=ax)
+    ax.set_title("Current vs. Forecasted Prices (Next Month)", fontsize=16, fontweight='bold')
+    ax.set_ylabel("Price (Rs./Quintal)", fontsize=12)
+    ax.set_xlabel("", fontsize=12)
+    _rotate_xticks(ax)
+    ax.grid(axis='y', alpha=0.3)
+
+
+def plot_price_trends(fig, price_change_data):
+    ax = fig.subplots()
+    trend_df = pd.DataFrame(price_change_data)
+    trend_df = trend_df.sort_values(by="12 Months", ascending=False)
+    trend_df.plot(x="Crop", y=["1 Month", "6 Months", "12 Months"],
+                  kind="bar", color=["#1f77b4", "#ff7f0e", "#2ca02c"], ax=ax)
+    ax.set_title("Forecasted Price Change by Timeframe", fontsize=16, fontweight='bold')
+    ax.set_ylabel("Price Change (%)", fontsize=12)
+    ax.set_xlabel("", fontsize=12)
+    ax.axhline(y=0, color='r', linestyle='-', alpha=0.3)
+    _rotate_xticks(ax)
+    ax.grid(axis='y', alpha=0.3)
+
+
+def plot_comparative_forecast(fig, summary_df, all_crops_forecast):
+    ax = fig.subplots()
+    top_crops = summary_df.sort_values(by="Long Term Trend (%)", ascending=False).head(5)["Crop"].tolist()
+    for crop in top_crops:
+        if crop in all_crops_forecast:
+            data = all_crops_forecast[crop]
+            current = data['current_price']
+            normalized_forecast = [(price/current)*100 for price in data['prices']]
+            ax.plot(data['dates'], normalized_forecast, label=crop, linewidth=2)
+    ax.set_title("Top 5 Crops - Comparative Price Forecast (% Change)", fontsize=16, fontweight='bold')
+    ax.set_ylabel("Price (% of Current)", fontsize=12)
+    ax.set_xlabel("Date", fontsize=12)
+    ax.grid(True, alpha=0.3)
+    ax.legend(loc="best")
+    fig.autofmt_xdate()
+    ax.axhline(y=100, color='black', linestyle='--', alpha=0.5, label='Current Price Level')
+    from matplotlib.ticker import PercentFormatter
+    ax.yaxis.set_major_formatter(PercentFormatter())
+
+
+def plot_growth_vs_price(fig, growth_df):
+    ax = fig.subplots()
+    ax.scatter(growth_df["Growth Duration (Months)"],
+               growth_df["Forecasted Price (Next Month)"],
+               s=100, alpha=0.7)
+    for idx, row in growth_df.iterrows():
+        ax.annotate(row["Crop"],
+                    (row["Growth Duration (Months)"], row["Forecasted Price (Next Month)"]),
+                    xytext=(5, 5), textcoords="offset points")
+    ax.set_title("Relationship Between Growth Duration and Price", fontsize=16, fontweight='bold')
+    ax.set_xlabel("Growth Duration (Months)", fontsize=12)
+    ax.set_ylabel("Forecasted Price (Rs./Quintal)", fontsize=12)
+    ax.grid(True, alpha=0.3)
+
+
+# Chart name -> default figure size in inches
+chart_sizes = {
+    'forecast': (12, 6),
+    'price_comparison': (14, 8),
+    'price_trends': (14, 8),
+    'comparative_forecast': (14, 8),
+    'growth_vs_price': (12, 8),
+}
+
+
+def render_chart(plot, args, width, height, dpi, fmt):
+    _setup_matplotlib()
+    from matplotlib.figure import Figure
+
+    # Figures are created without pyplot so concurrent requests never share drawing state
+    fig = Figure(figsize=(width, height))
+    plot(fig, *args)
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi)
+    return buffer.getvalue()
+
+
+def chart_key(name, data_fingerprint, crop, width, height, dpi, fmt):
+    raw = repr((name, data_fingerprint, crop, float(width), float(height), int(dpi), fmt))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _chart_path(key, fmt):
+    return os.path.join(chart_cache_dir, f"{key}.{fmt}")
+
+
+def load_chart(key, fmt):
+    try:
+        with open(_chart_path(key, fmt), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def save_chart(key, fmt, data):
+    os.makedirs(chart_cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=chart_cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, _chart_path(key, fmt))
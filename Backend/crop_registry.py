@@ -0,0 +1,56 @@
+import os
+import threading
+
+# Crops to analyze: listed in a registry file (one crop or CSV file name per line, '#'
+# starts a comment) when it exists, otherwise every CSV in the data directory
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _stamp(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def read_registry(registry_path):
+    crop_files = []
+    with open(registry_path, encoding="utf-8") as f:
+        for line in f:
+            name = line.split('#', 1)[0].strip()
+            if not name:
+                continue
+            if not name.endswith('.csv'):
+                name = f"{name}.csv"
+            if name not in crop_files:
+                crop_files.append(name)
+    return crop_files
+
+
+def discover_crop_files(data_dir):
+    return sorted(f for f in os.listdir(data_dir) if f.endswith('.csv'))
+
+
+def get_crop_files(data_dir, registry_path=None):
+    # Re-read only when the registry file or the data directory listing changed
+    key = (data_dir, registry_path)
+    stamp = (_stamp(registry_path) if registry_path else None, _stamp(data_dir))
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    if stamp[0] is not None:
+        crop_files = read_registry(registry_path)
+        missing = [f for f in crop_files if not os.path.exists(os.path.join(data_dir, f))]
+        if missing:
+            print(f"Warning: crops in {registry_path} without data files: {', '.join(missing)}")
+            crop_files = [f for f in crop_files if f not in missing]
+    else:
+        crop_files = discover_crop_files(data_dir)
+
+    with _cache_lock:
+        _cache[key] = (stamp, crop_files)
+    return crop_files
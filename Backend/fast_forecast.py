@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+# Batched forecaster for monthly price series: a recency-weighted harmonic regression
+# (level + linear trend + yearly seasonality) fitted for every series at once with
+# NumPy normal equations, as a fast alternative to one SARIMAX fit per series.
+
+harmonics = 2
+half_life_months = 24
+min_observations = 12
+ridge = 1e-6
+
+
+def _features(rel_years, calendar_month):
+    # rel_years: time relative to each series' last observation (in years)
+    # calendar_month: 0-based month of year
+    columns = [np.ones_like(rel_years), rel_years]
+    for k in range(1, harmonics + 1):
+        angle = 2 * np.pi * k * calendar_month / 12
+        columns.append(np.broadcast_to(np.sin(angle), rel_years.shape))
+        columns.append(np.broadcast_to(np.cos(angle), rel_years.shape))
+    return np.stack(columns, axis=-1)
+
+
+def batch_forecast(series_list, steps=12):
+    # Forecast every monthly (month-end indexed) series `steps` months past its own last
+    # month. Returns one forecast Series per input, or None for series too short to fit.
+    results = [None] * len(series_list)
+    usable = [i for i, s in enumerate(series_list)
+              if s is not None and len(s) and s.notna().sum() >= min_observations]
+    if not usable:
+        return results
+
+    # Align all series on one monthly grid (months since 1970-01)
+    starts = np.array([series_list[i].index[0].year * 12 + series_list[i].index[0].month - 1 for i in usable])
+    lengths = np.array([len(series_list[i]) for i in usable])
+    grid_start = starts.min()
+    n_months = int((starts + lengths).max() - grid_start)
+    values = np.full((len(usable), n_months), np.nan)
+    for row, i in enumerate(usable):
+        offset = starts[row] - grid_start
+        values[row, offset:offset + lengths[row]] = series_list[i].values
+
+    observed = ~np.isnan(values)
+    months = np.arange(n_months)
+    last = n_months - 1 - np.argmax(observed[:, ::-1], axis=1)
+    rel_months = months[None, :] - last[:, None]
+    calendar_month = (grid_start + months) % 12
+
+    # Weighted least squares per series, solved as a batch of small normal equation systems
+    X = _features(rel_months / 12.0, calendar_month[None, :])
+    weights = observed * 0.5 ** (-rel_months.clip(max=0) / half_life_months)
+    y = np.where(observed, values, 0.0)
+    A = np.einsum('st,stp,stq->spq', weights, X, X) + ridge * np.eye(X.shape[-1])
+    b = np.einsum('st,stp,st->sp', weights, X, y)
+    beta = np.linalg.solve(A, b[..., None])[..., 0]
+
+    horizon = np.arange(1, steps + 1)
+    future_month = (grid_start + last[:, None] + horizon[None, :]) % 12
+    future_X = _features(np.broadcast_to(horizon / 12.0, future_month.shape), future_month)
+    predictions = np.einsum('shp,sp->sh', future_X, beta)
+
+    for row, i in enumerate(usable):
+        series = series_list[i]
+        last_date = series.index[0] + pd.offsets.MonthEnd(int(last[row] - (starts[row] - grid_start)))
+        future_dates = pd.date_range(start=last_date, periods=steps + 1, freq='M')[1:]
+        results[i] = pd.Series(predictions[row], index=future_dates, name='predicted_mean')
+    return results
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+
+# Directory holding persisted forecast outputs
+cache_dir = os.environ.get("FORECAST_CACHE_DIR", os.path.join("cache", "forecasts"))
+
+# Directory holding the last fitted model state per series, used to warm-start refits
+model_state_dir = os.environ.get("MODEL_STATE_DIR", os.path.join("cache", "models"))
+
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def file_fingerprint(path):
+    # Content hash of a data file; only re-hashed when its size or mtime changes
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    with _fingerprints_lock:
+        cached = _fingerprints.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    fingerprint = digest.hexdigest()
+
+    with _fingerprints_lock:
+        _fingerprints[path] = (stamp, fingerprint)
+    return fingerprint
+
+
+def forecast_key(fingerprint, order, seasonal_order, forecast_steps, market=None):
+    raw = repr((fingerprint, market, tuple(order), tuple(seasonal_order), forecast_steps))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def model_state_key(crop, market, order, seasonal_order):
+    # Unlike forecast keys this does not depend on the data, so a series keeps its state
+    # across data updates
+    raw = repr((crop, market, tuple(order), tuple(seasonal_order)))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _load_pickle(path, label):
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable {label} {path}: {e}")
+        return None
+
+
+def _save_pickle(directory, path, value):
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so concurrent readers never see a partial entry
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _entry_path(key):
+    return os.path.join(cache_dir, f"{key}.pkl")
+
+
+def load_forecast(key):
+    return _load_pickle(_entry_path(key), "forecast cache entry")
+
+
+def save_forecast(key, value):
+    _save_pickle(cache_dir, _entry_path(key), value)
+
+
+def _state_path(key):
+    return os.path.join(model_state_dir, f"{key}.pkl")
+
+
+def load_model_state(key):
+    return _load_pickle(_state_path(key), "model state")
+
+
+def save_model_state(key, state):
+    _save_pickle(model_state_dir, _state_path(key), state)
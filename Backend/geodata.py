@@ -1,117 +1,99 @@
 from flask import Flask, request, jsonify
-from sklearn.preprocessing import MinMaxScaler
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense, Dropout
-from rasterio.transform import rowcol
-from pyproj import Transformer, CRS
-import plotly.subplots as sp
-import plotly.graph_objects as go
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-import rasterio
-import requests
+from numpy.lib.stride_tricks import sliding_window_view
 import datetime
-import time
-import glob
+import math
 import os
 import re
+import weakref
+import metrics
+from raster_layers import registry as raster_registry
+from raster_cube import current_cube
+from weather_store import get_daily, snap
+import weather_models
+from weather_climatology import forecast_climatology
+
+# TensorFlow, scikit-learn and plotly are imported inside the functions that use them, so
+# raster-only requests and the climatology forecaster never load them
+
+# Largest number of points accepted by /get_data/batch
+max_batch_points = int(os.environ.get("GIS_BATCH_MAX_POINTS", 10000))
+
+# Weather forecasting model: 'per_column' trains one LSTM per weather column, 'multivariate'
+# trains a single LSTM on all columns jointly (about a third of the training time),
+# 'climatology' fits a day-of-year harmonic regression with NumPy (no TensorFlow)
+weather_model_modes = ('per_column', 'multivariate', 'climatology')
+weather_model_mode = os.environ.get("WEATHER_MODEL_MODE", "per_column")
+# Roll forecasts out through a traced step function instead of one predict() per step
+fast_inference = os.environ.get("WEATHER_FAST_INFERENCE", "1") != "0"
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
+metrics.install(app)
 
 def get_raster_values(lat, lon, raster_paths, default_crs="EPSG:32643"):
+    # A prebuilt raster cube (see raster_cube.py) answers with one read when it is up to date
+    cube = current_cube(raster_paths)
+    if cube is not None:
+        return cube.values_at(lat, lon)
+
     results = {}
 
     for raster_path in raster_paths:
-            with rasterio.open(raster_path) as dataset:
-                dataset_crs = dataset.crs if dataset.crs else CRS.from_string(default_crs)
-
-                transformer = Transformer.from_crs("EPSG:4326", dataset_crs, always_xy=True)
-                x, y = transformer.transform(lon, lat)
-                row, col = rowcol(dataset.transform, x, y)
-
-                value = dataset.read(1)[row, col]
-
-                min_val = dataset.read(1).min()
-                max_val = dataset.read(1).max()
-                
-                # Extract filename without extension and store the value
-                file_name = os.path.splitext(os.path.basename(raster_path))[0]
-                
-                if file_name == 'meanticd':
-                    file_name = "inorganic_carbon_density"
-                elif file_name == 'meantocd':
-                    file_name = "organic_carbon_density"
-            
-                elif file_name =='fsalt':
-                    file_name = "salt_affected"
-                    value = (value - min_val) / (max_val - min_val) * 100
-                elif file_name =='fwatero':
-                    file_name = "water_erosion"
-                    value = (value - min_val) / (max_val - min_val) * 100
-                elif file_name =='fwindero':
-                    file_name = "wind_erosion"
-                    value = (value - min_val) / (max_val - min_val) * 100
-                elif file_name =='fwaterlog':
-                    file_name = "water_logging"
-                    value = (value - min_val) / (max_val - min_val) * 100
-
-                elif file_name.startswith('ffallow'):
-                    file_name = "fallow"
-                    value = (value - min_val) / (max_val - min_val) * 100
-                elif file_name.startswith('fkharif'):
-                    file_name = "kharif"
-                    value = (value - min_val) / (max_val - min_val) * 100
-                elif file_name.startswith('frabi'):
-                    file_name = "rabi"
-                    value = (value - min_val) / (max_val - min_val) * 100
-                elif file_name.startswith('fnsa'):
-                    file_name = "net_sown_area"
-                    value = (value - min_val) / (max_val - min_val) * 100
-                
-                elif file_name.startswith('rootsm'):
-                    file_name = "root_level_surface_moisture"
-                elif file_name.startswith('s_runoff'):
-                    file_name = "surface_runoff"
-                elif file_name.startswith('upSMNRSC'):
-                    file_name = "upper_level_surface_moisture"
-                elif file_name.startswith('ocm2_vf'):
-                    file_name = "vegetation_fraction"
-                elif file_name.startswith('ocm2_ndvi_filt'):
-                    file_name = "filtered_ndvi"
-                elif file_name.startswith('localocm2'):
-                    file_name = "local_ndvi"
-                elif file_name.startswith('globalocm2'):
-                    file_name = "global_ndvi"
-                elif file_name.startswith('evaNHP'):
-                    file_name = "evapotranspiration"
-
-                results[file_name] = float(round(value, 2))
+        # Rasters stay open between requests; only the blocks holding the pixel are read
+        layer = raster_registry.get(raster_path, default_crs)
+        value = layer.value_at(lat, lon)
+        results[layer.name] = float(round(value, 2))
+
+    return results
 
+def get_raster_values_many(lats, lons, raster_paths, default_crs="EPSG:32643"):
+    # {layer name: array of values per point}, NaN where a point is outside a layer
+    cube = current_cube(raster_paths)
+    if cube is not None:
+        return cube.values_at_many(lats, lons)
+
+    results = {}
+    for raster_path in raster_paths:
+        layer = raster_registry.get(raster_path, default_crs)
+        results[layer.name] = layer.values_at_many(lats, lons)
     return results
 
+def sample_points(lats, lons, raster_paths, default_crs="EPSG:32643"):
+    # Soil and land-use features for many points: a list of classes_data results
+    columns = get_raster_values_many(lats, lons, raster_paths, default_crs)
+    # Rounded per column in the band's dtype, as get_raster_values rounds each value
+    columns = {name: np.round(values, 2).tolist() for name, values in columns.items()}
+    names = list(columns)
+    return [classes_data(dict(zip(names, row))) for row in zip(*columns.values())]
+
 def classes_data(raster_values):
     new_dict={}
 
     soil_keys = ("floamy", "fclayey", "fclayskeletal", "fsandy")
+    # NaN (point outside the layer) never wins; None when no layer covers the point
     soil_values = {key: raster_values.get(key, 0) for key in soil_keys}
-    max_soil_type = max(soil_values, key=soil_values.get)
+    soil_values = {key: value for key, value in soil_values.items() if not math.isnan(value)}
+    max_soil_type = max(soil_values, key=soil_values.get) if soil_values else None
     
     soil_depth_keys = (
         "fsoildep0_25", "fsoildep25_50", "fsoildep50_75",
         "fsoildep75_100", "fsoildep100_150", "fsoildep150_200"
     )
     soil_depth_values = {key: raster_values.get(key, 0) for key in soil_depth_keys}
-    max_soil_depth = max(soil_depth_values, key=soil_depth_values.get)
+    soil_depth_values = {key: value for key, value in soil_depth_values.items() if not math.isnan(value)}
+    max_soil_depth = max(soil_depth_values, key=soil_depth_values.get) if soil_depth_values else None
     
     for key in list(raster_values.keys()):  
         if key not in soil_keys and key not in soil_depth_keys:
             new_dict[key] = raster_values[key]
 
-    new_dict['soil_type'] = max_soil_type[1:]
+    new_dict['soil_type'] = max_soil_type[1:] if max_soil_type else None
 
-    match = re.search(r"(\d+)_(\d+)", max_soil_depth)
+    soil_depth = None
+    match = re.search(r"(\d+)_(\d+)", max_soil_depth) if max_soil_depth else None
     if match:
         start, end = match.groups()
         soil_depth = f"{start}-{end}m"
@@ -124,122 +106,181 @@ def classes_data(raster_values):
     return new_dict
 
 def fetch_weather_data(lat, lon, years=5, delay=0):
+    # delay: optional minimum seconds between request starts, on top of WEATHER_RATE_LIMIT
     today = datetime.date.today() - datetime.timedelta(days=5)  # Adjust start date to 5 days prior
-    start_year = today.year - years 
-    end_year = today.year  
-    
-    all_data = []
-    for year in range(start_year, end_year):
-        start_date = f"{year}-{today.month:02d}-{today.day:02d}"
-        end_date = f"{year + 1}-{today.month:02d}-{today.day:02d}" 
-
-        url = (f"https://archive-api.open-meteo.com/v1/archive?latitude={lat}&longitude={lon}"
-               f"&start_date={start_date}&end_date={end_date}"
-               f"&daily=temperature_2m_max,temperature_2m_min,precipitation_sum,relative_humidity_2m_mean"
-               f"&timezone=auto")
-        
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            data = response.json()
-
-            if ("daily" in data and 
-                "time" in data["daily"] and 
-                "temperature_2m_max" in data["daily"] and 
-                "temperature_2m_min" in data["daily"] and 
-                "precipitation_sum" in data["daily"]):
-                
-                dates = data["daily"]["time"]
-                temp_max = data["daily"]["temperature_2m_max"]
-                temp_min = data["daily"]["temperature_2m_min"]
-                rainfall = data["daily"]["precipitation_sum"]
-
-                if "relative_humidity_2m_mean" in data["daily"]:
-                    humidity = data["daily"]["relative_humidity_2m_mean"]
-                else:
-                    humidity = [None] * len(dates)
-                    print("Humidity data not available")
-                
-                for i in range(len(dates)):
-                    if temp_max[i] is not None and temp_min[i] is not None:
-                        avg_temp = (temp_max[i] + temp_min[i]) / 2
-                    else:
-                        avg_temp = None
-
-                    rain_val = rainfall[i] if rainfall[i] is not None else None
-                    hum_val = humidity[i] if i < len(humidity) else None
-                    
-                    all_data.append([dates[i], avg_temp, rain_val, hum_val])
-            else:
-                print(f"Missing required data fields for {year}")
-                print(f"Available fields: {data.get('daily', {}).keys()}")
-        else:
-            print(f"Error fetching data for {year}: {response.status_code}")
-            print(f"Error message: {response.text}") 
-        
-        # Add delay between requests to avoid rate limiting
-        if delay > 0 and year < end_year - 1:  # Don't delay after the last request
-            time.sleep(delay)
-    
-    if all_data:
-        df = pd.DataFrame(all_data, columns=["date", "Temperature", "Rainfall", "Humidity"])
-        df["date"] = pd.to_datetime(df["date"])
-        return df
-    else:
+    try:
+        start = today.replace(year=today.year - years)
+    except ValueError:  # Feb 29
+        start = today.replace(year=today.year - years, day=28)
+
+    # Served from the local archive; only days it does not hold yet are downloaded
+    daily = get_daily(lat, lon, start, today, delay)
+    if daily.empty:
         print("No data collected")
         return pd.DataFrame()
-    
 
-def forecast_lstm(df, forecast_periods=180, seq_length=10, epochs=50, batch_size=32):
+    df = pd.DataFrame({
+        "date": pd.to_datetime(daily["date"]),
+        "Temperature": (daily["temperature_2m_max"] + daily["temperature_2m_min"]) / 2,
+        "Rainfall": daily["precipitation_sum"],
+        "Humidity": daily["relative_humidity_2m_mean"],
+    })
+    return df
+
+
+def training_windows(scaled_data, seq_length):
+    # (samples, seq_length, features) windows over the scaled rows and the row following
+    # each window, as strided views rather than copies
+    X = sliding_window_view(scaled_data[:-1], seq_length, axis=0).transpose(0, 2, 1)
+    y = scaled_data[seq_length:]
+    return X, y
+
+
+def build_lstm(seq_length, n_features):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import LSTM, Dense, Dropout
+
+    model = Sequential()
+    model.add(LSTM(50, return_sequences=True, input_shape=(seq_length, n_features)))
+    model.add(Dropout(0.2))
+    model.add(LSTM(50))
+    model.add(Dropout(0.2))
+    model.add(Dense(n_features))
+
+    model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+
+def predict_loop(model, last_window, forecast_periods):
+    # Original rollout: one Keras predict() call and a rebuilt window per step (kept for
+    # WEATHER_FAST_INFERENCE=0 and as the benchmark baseline)
+    predictions = []
+    current_batch = last_window.reshape(1, *last_window.shape)
+    for i in range(forecast_periods):
+        current_pred = model.predict(current_batch, verbose=0)[0]
+
+        predictions.append(current_pred)
+
+        current_batch = np.append(current_batch[:, 1:, :],
+                                  [[current_pred]],
+                                  axis=1)
+    return np.array(predictions)
+
+
+_step_functions = weakref.WeakKeyDictionary()
+
+
+def step_function(model):
+    # The model's forward pass traced once into a graph function (any batch size), so a step
+    # costs one graph call instead of a predict() setup. The function holds only a weak
+    # reference, so the cache entry goes away with the model
+    step = _step_functions.get(model)
+    if step is None:
+        import tensorflow as tf
+        model_ref = weakref.ref(model)
+        step = _step_functions[model] = tf.function(lambda window: model_ref()(window, training=False),
+                                                    reduce_retracing=True)
+    return step
+
+
+def forecast_sequences(model, last_windows, forecast_periods):
+    # Autoregressive rollout of a batch of (seq_length, features) windows at once, e.g. many
+    # locations sharing a model. Windows and predictions live in one preallocated buffer;
+    # step t reads rows t..t+seq_length and writes row t+seq_length.
+    # Returns (batch, forecast_periods, features).
+    batch, seq_length, n_features = last_windows.shape
+    buffer = np.empty((batch, seq_length + forecast_periods, n_features), dtype=np.float32)
+    buffer[:, :seq_length] = last_windows
+    step = step_function(model)
+    for t in range(forecast_periods):
+        buffer[:, seq_length + t] = step(buffer[:, t:t + seq_length]).numpy()
+    return buffer[:, seq_length:]
+
+
+def forecast_sequence(model, last_window, forecast_periods):
+    # Autoregressive forecast: each predicted step is fed back as the window's newest row
+    with metrics.stage("lstm_inference"):
+        if not fast_inference:
+            return predict_loop(model, last_window, forecast_periods)
+        return forecast_sequences(model, last_window[np.newaxis], forecast_periods)[0]
+
+
+def fit_weather_model(values, seq_length, epochs, batch_size, key=None, data_end=None):
+    # (model, scaler) for a (rows, features) array. With a key the model comes from the
+    # weather model registry and is only trained when none is cached or it is stale
+    def train():
+        from sklearn.preprocessing import MinMaxScaler
+
+        scaler = MinMaxScaler(feature_range=(0, 1))
+        scaled_data = scaler.fit_transform(values)
+        X, y = training_windows(scaled_data, seq_length)
+
+        model = build_lstm(seq_length, values.shape[1])
+        with metrics.stage("lstm_train"):
+            model.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=0)
+        return model, scaler
+
+    if key is None:
+        return train()
+
+    def fine_tune(model, scaler, trained_through):
+        # A few epochs on the days since the last training (at least the newest
+        # WEATHER_MODEL_FINE_TUNE_DAYS), scaled with the model's original scaler. A copy is
+        # trained and returned, since other requests may be forecasting with the cached model
+        from tensorflow.keras.models import clone_model
+
+        days = max((data_end - trained_through).days, weather_models.fine_tune_days)
+        scaled_data = scaler.transform(values[-(days + seq_length):])
+        X, y = training_windows(scaled_data, seq_length)
+        tuned = clone_model(model)
+        tuned.set_weights(model.get_weights())
+        tuned.compile(optimizer='adam', loss=model.loss)
+        with metrics.stage("lstm_fine_tune"):
+            tuned.fit(X, y, epochs=weather_models.fine_tune_epochs, batch_size=batch_size, verbose=0)
+        return tuned
+
+    return weather_models.registry.get(key, data_end, train, fine_tune)
+
+
+def forecast_lstm(df, forecast_periods=180, seq_length=10, epochs=50, batch_size=32, mode=None, region=None):
+    # region: weather grid cell the data belongs to; when given, trained models are reused
+    # across requests through the weather model registry
     forecast_start_date = df.index[-1] + pd.Timedelta(days=1)
     future_dates = pd.date_range(start=forecast_start_date + pd.Timedelta(days=1), 
                                 periods=forecast_periods)
     forecast_df = pd.DataFrame(index=future_dates)
     
     models = {}
-    
-    for column in df.columns:
-        scaler = MinMaxScaler(feature_range=(0, 1))
-        scaled_data = scaler.fit_transform(df[column].values.reshape(-1, 1))
-        
-        X, y = [], []
-        for i in range(len(scaled_data) - seq_length):
-            X.append(scaled_data[i:(i + seq_length), 0])
-            y.append(scaled_data[i + seq_length, 0])
-        X, y = np.array(X), np.array(y)
-        
-        X = np.reshape(X, (X.shape[0], X.shape[1], 1))
-
-        model = Sequential()
-        model.add(LSTM(50, return_sequences=True, input_shape=(seq_length, 1)))
-        model.add(Dropout(0.2))
-        model.add(LSTM(50))
-        model.add(Dropout(0.2))
-        model.add(Dense(1))
-        
-        model.compile(optimizer='adam', loss='mean_squared_error')
-        model.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=0)
-        models[column] = model
-        
-        predictions = []
-        current_batch = scaled_data[-seq_length:].reshape(1, seq_length, 1)
-        
-        for i in range(forecast_periods):
-            current_pred = model.predict(current_batch, verbose=0)[0]
-            
-            predictions.append(current_pred[0])
-            
-            current_batch = np.append(current_batch[:, 1:, :], 
-                                     [[current_pred]], 
-                                     axis=1)
-            
-        predictions = scaler.inverse_transform(np.array(predictions).reshape(-1, 1))
-        forecast_df[column] = predictions
+    mode = mode or weather_model_mode
+
+    # 'multivariate' is one model over all columns, predicting every column per step
+    if mode == 'multivariate':
+        series = [('multivariate', list(df.columns))]
+    else:
+        series = [(column, [column]) for column in df.columns]
+    window_years = round((df.index[-1] - df.index[0]).days / 365.25)
+
+    for name, columns in series:
+        values = df[columns].values
+        key = None
+        if region is not None:
+            key = (region, name, tuple(columns), seq_length, epochs, window_years)
+        model, scaler = fit_weather_model(values, seq_length, epochs, batch_size, key, df.index[-1].date())
+        models[name] = model
+
+        scaled_data = scaler.transform(values[-seq_length:])
+        predictions = forecast_sequence(model, scaled_data, forecast_periods)
+        predictions = scaler.inverse_transform(predictions)
+        for i, column in enumerate(columns):
+            forecast_df[column] = predictions[:, i]
     
     return forecast_df, models
 
 
 def create_interactive_plots(df, output_file="weather.html"):
+    import plotly.subplots as sp
+    import plotly.graph_objects as go
+
     df = df.copy()
     
     if 'Unnamed: 0' in df.columns:
@@ -310,14 +351,22 @@ def get_data():
     lon = request.args.get('lon', type=float)
 
     forecast_period=120
+    mode = request.args.get('mode', weather_model_mode)
+    if mode not in weather_model_modes:
+        return jsonify({"error": f"Unknown weather model mode: {mode}"}), 400
 
-    weather_df = fetch_weather_data(lat, lon, delay=2) 
+    with metrics.stage("weather_fetch"):
+        weather_df = fetch_weather_data(lat, lon)
 
     weather_df.set_index("date", inplace=True)
     weather_df.index = pd.to_datetime(weather_df.index)
-    forecast_df, models = forecast_lstm(weather_df,forecast_periods=forecast_period)
+    if mode == 'climatology':
+        forecast_df, models = forecast_climatology(weather_df, forecast_periods=forecast_period)
+    else:
+        forecast_df, models = forecast_lstm(weather_df,forecast_periods=forecast_period,mode=mode,region=snap(lat, lon))
     
-    create_interactive_plots(forecast_df)
+    with metrics.stage("plot"):
+        create_interactive_plots(forecast_df)
     weather_graph_path="weather.html"
 
     avg_temperature = forecast_df['Temperature'].mean()
@@ -328,8 +377,9 @@ def get_data():
         return jsonify({"error": "Missing lat or lon parameters"}), 400
     
     folder_path = "gis_data"
-    raster_files = glob.glob(os.path.join(folder_path, "*.asc")) + glob.glob(os.path.join(folder_path, "*.tif"))
-    raster_values = get_raster_values(lat, lon, raster_files, "EPSG:32643")
+    raster_files = raster_registry.paths(folder_path)
+    with metrics.stage("raster_read"):
+        raster_values = get_raster_values(lat, lon, raster_files, "EPSG:32643")
     raster_values = classes_data(raster_values)
 
     raster_values['avg_temperature'] = round(float(avg_temperature),2)
@@ -366,6 +416,40 @@ def get_data():
 
     return jsonify(raster_values)
 
+@app.route('/get_data/batch', methods=['POST'])
+def get_data_batch():
+    # Soil/land-use layers only (no weather or forecasting) for many {"lat", "lon"} points,
+    # returned as a table with one row per point
+    payload = request.get_json(silent=True)
+    points = payload.get('points') if isinstance(payload, dict) else payload
+    if not isinstance(points, list) or not points:
+        return jsonify({"error": "Expected a JSON list of points"}), 400
+    if len(points) > max_batch_points:
+        return jsonify({"error": f"At most {max_batch_points} points per request"}), 400
+    try:
+        points = [(float(point['lat']), float(point['lon'])) if isinstance(point, dict)
+                  else (float(point[0]), float(point[1])) for point in points]
+    except (KeyError, IndexError, TypeError, ValueError):
+        return jsonify({"error": "Each point needs numeric lat and lon"}), 400
+    # float() accepts "nan" and "inf", which the market and raster lookups cannot place
+    if not all(math.isfinite(lat) and math.isfinite(lon) for lat, lon in points):
+        return jsonify({"error": "Each point needs finite lat and lon"}), 400
+
+    lats = np.array([point[0] for point in points])
+    lons = np.array([point[1] for point in points])
+    raster_files = raster_registry.paths("gis_data")
+    with metrics.stage("raster_read"):
+        features = sample_points(lats, lons, raster_files, "EPSG:32643")
+
+    columns = ["lat", "lon"] + sorted({key for row in features for key in row})
+    rows = []
+    for (lat, lon), row in zip(points, features):
+        values = [row.get(column) for column in columns[2:]]
+        # Points outside a layer have no value
+        values = [None if isinstance(value, float) and np.isnan(value) else value for value in values]
+        rows.append([lat, lon] + values)
+    return jsonify({"columns": columns, "rows": rows})
+
 if __name__ == '__main__':
     app.run(host="0.0.0.0",debug=True,port=7100)
 
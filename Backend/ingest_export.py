@@ -0,0 +1,104 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+import price_store
+from price_store import date_column, market_column, parse_dates, price_column
+
+# Splits a raw all-commodity mandi price export (one large CSV) into the per-crop CSVs in
+# market_data/ that the analysis reads. The export is streamed in fixed-size chunks, so
+# memory use depends on the chunk size rather than the size of the export.
+# Usage: python ingest_export.py prices_export.csv --store
+
+commodity_column = 'Commodity'
+chunk_rows = 500_000
+
+
+def crop_file_name(commodity):
+    # Commodity names may contain path separators
+    return f"{str(commodity).strip().replace('/', '-')}.csv"
+
+
+def split_export(export_path, data_dir=None, chunksize=chunk_rows, columns=None):
+    # Returns {crop file: rows written}. Per-crop files are written to a temporary directory
+    # and moved into data_dir once the whole export has been read, so a failed run leaves
+    # the existing files untouched
+    data_dir = data_dir or price_store.data_dir
+    columns = columns or {}
+    commodity = columns.get('commodity', commodity_column)
+    market = columns.get('market', market_column)
+    date = columns.get('date', date_column)
+    price = columns.get('price', price_column)
+
+    os.makedirs(data_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(dir=data_dir, prefix=".ingest_")
+    handles = {}
+    counts = {}
+    total_rows = 0
+    start = time.perf_counter()
+    try:
+        reader = pd.read_csv(export_path, usecols=[commodity, market, date, price], chunksize=chunksize,
+                             dtype={commodity: str, market: str, date: str, price: str})
+        for chunk_number, chunk in enumerate(reader, 1):
+            total_rows += len(chunk)
+            # The date format is detected on a sample of each chunk rather than retried over the column
+            dates = parse_dates(chunk[date], f"chunk {chunk_number}")
+            prices = pd.to_numeric(chunk[price].str.replace(',', '', regex=False), errors='coerce')
+            rows = pd.DataFrame({
+                'commodity': chunk[commodity],
+                market_column: chunk[market],
+                date_column: dates.dt.strftime("%Y-%m-%d"),
+                price_column: prices,
+            })
+            rows = rows.dropna(subset=['commodity', date_column])
+
+            for name, group in rows.groupby('commodity', sort=False):
+                crop_file = crop_file_name(name)
+                handle = handles.get(crop_file)
+                if handle is None:
+                    handle = handles[crop_file] = open(os.path.join(work_dir, crop_file), "w", newline="", encoding="utf-8")
+                    handle.write(f"{market_column},{date_column},{price_column}\n")
+                group.drop(columns='commodity').to_csv(handle, header=False, index=False)
+                counts[crop_file] = counts.get(crop_file, 0) + len(group)
+
+            elapsed = time.perf_counter() - start
+            print(f"Chunk {chunk_number}: {total_rows} rows read, {len(counts)} crops ({total_rows / elapsed:,.0f} rows/s)")
+
+        for handle in handles.values():
+            handle.close()
+        for crop_file in counts:
+            os.replace(os.path.join(work_dir, crop_file), os.path.join(data_dir, crop_file))
+    finally:
+        for handle in handles.values():
+            handle.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Split {total_rows} rows into {len(counts)} crop files in {data_dir}")
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Split a raw mandi price export into per-crop CSVs")
+    parser.add_argument("export", help="CSV export covering all commodities and markets")
+    parser.add_argument("--data-dir", default=price_store.data_dir)
+    parser.add_argument("--chunksize", type=int, default=chunk_rows, help="rows read per chunk")
+    parser.add_argument("--commodity-column", default=commodity_column)
+    parser.add_argument("--market-column", default=market_column)
+    parser.add_argument("--date-column", default=date_column)
+    parser.add_argument("--price-column", default=price_column)
+    parser.add_argument("--store", action="store_true", help="also rebuild the price store for the written crops")
+    args = parser.parse_args()
+
+    counts = split_export(args.export, args.data_dir, args.chunksize, {
+        'commodity': args.commodity_column,
+        'market': args.market_column,
+        'date': args.date_column,
+        'price': args.price_column,
+    })
+    if args.store:
+        for crop_file in counts:
+            price_store.ingest_crop(crop_file, args.data_dir)
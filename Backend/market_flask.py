@@ -1,35 +1,65 @@
 import os
 import math
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend to prevent GUI errors
+import argparse
+import hashlib
+import threading
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from statsmodels.tsa.statespace.sarimax import SARIMAX
 from datetime import datetime
-import matplotlib.ticker as ticker
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from textwrap import dedent
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-
-# Set plot style for better visualization
-plt.style.use('ggplot')
-sns.set_palette("Set2")
+from market_index import get_market_index
+from crop_registry import get_crop_files
+from backtest import selected_orders
+from forecast_cache import (forecast_key, load_forecast, save_forecast, model_state_key, load_model_state,
+                            save_model_state)
+from price_store import append_prices, load_partition
+from fast_forecast import batch_forecast
+from response_cache import ResponseCache, cached_response
+import metrics
+from charts import (chart_formats, chart_sizes, default_dpi, max_dpi, max_inches, render_chart, chart_key,
+                    load_chart, save_chart, plot_crop_forecast, plot_price_comparison, plot_price_trends,
+                    plot_comparative_forecast, plot_growth_vs_price)
 
 # Directory containing crop data files
 directory = "market_data"  # Update this path if needed
 
-# List of crop CSV files
-crop_files = [
-    "Wheat.csv", "Tomato.csv", "Rice.csv", "Potato.csv", "Beans.csv",
-    "Onion.csv", "Masur Dal.csv", "Maize.csv", "Bajra(Pearl Millet-Cumbu).csv", "Ajwan.csv"
-]
+# Crop CSV files to analyze; None discovers them from the registry file (when it exists)
+# or from the CSV files in the data directory
+crop_files = None
+crop_registry_file = os.environ.get("CROP_REGISTRY", "crop_registry.txt")
 
 # File with market latitude/longitude data
 market_lat_long_file = "market_lat_long.csv"
 
+# Restrict the analysis to the closest market's prices (falls back to all markets when the
+# closest market has no price data for any crop)
+filter_by_market = os.environ.get("MARKET_FILTER", "1") != "0"
+
+# Largest number of coordinates accepted by /get_market/batch
+max_batch_points = int(os.environ.get("MARKET_BATCH_MAX_POINTS", 5000))
+
+# Forecasting model: 'sarimax' fits one SARIMAX model per series, 'fast' fits every series
+# at once with a batched harmonic regression (see fast_forecast.py)
+forecast_modes = ('sarimax', 'fast')
+forecast_mode = os.environ.get("FORECAST_MODE", "sarimax")
+forecast_steps = 12
+
+# SARIMAX refit cadence: after a data update the saved parameters are first re-applied to
+# the new data without optimizing, and a full (warm-started) refit only happens once this
+# many updates have been absorbed that way (0 refits on every update)
+sarimax_refit_every = int(os.environ.get("SARIMAX_REFIT_EVERY", 7))
+
+# Number of worker processes used for per-crop analysis (1 runs everything in-process)
+analysis_workers = int(os.environ.get("MARKET_ANALYSIS_WORKERS", os.cpu_count() or 1))
+
+def active_crop_files():
+    return crop_files if crop_files is not None else get_crop_files(directory, crop_registry_file)
+
 def haversine(lat1, lon1, lat2, lon2):
     # Calculate the great circle distance between two points (in kilometers)
     R = 6371  # Earth radius in km
@@ -41,192 +71,66 @@ def haversine(lat1, lon1, lat2, lon2):
     return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 def get_closest_market(user_lat, user_lon):
-    # Read market latitude/longitude data
-    market_df = pd.read_csv(market_lat_long_file)
-    # Drop rows with missing lat or lon
-    market_df = market_df.dropna(subset=["Latitude", "Longitude"])
-    # Compute distance from user point for each market
-    market_df["Distance"] = market_df.apply(
-        lambda row: haversine(user_lat, user_lon, row["Latitude"], row["Longitude"]), axis=1)
-    # Get the market with the smallest distance
-    closest = market_df.loc[market_df["Distance"].idxmin()]
-    return closest["Market Name"]
-
-def get_market(user_lat=None, user_lon=None):
-    # If latitude and longitude are provided, determine the closest market name.
-    closest_market = None
-    if user_lat is not None and user_lon is not None:
-        try:
-            closest_market = get_closest_market(float(user_lat), float(user_lon))
-            print(f"Closest market based on provided coordinates: {closest_market}")
-        except Exception as e:
-            print(f"Error determining closest market: {e}")
-    
-    # Store results for analysis and comparison
-    crop_summaries = []
-    price_change_data = []
-    all_crops_forecast = {}
-
-    # Create output directory for saving plots
-    output_dir = "output"
-    os.makedirs(output_dir, exist_ok=True)
-
-    print(f"Starting analysis of {len(crop_files)} crops...")
-
-    output = {}
+    # Market coordinates are indexed once per process; the lookup is a KD-tree query
+    name, _ = get_market_index(market_lat_long_file).nearest(user_lat, user_lon, k=1)[0]
+    return name
 
-    for crop_file in crop_files:
-        file_path = os.path.join(directory, crop_file)
+def analyze_crop(crop_file, closest_market=None, include_history=False, mode='sarimax'):
+    # Analyze a single crop file and return its summary/forecast record, or None if the
+    # crop cannot be analyzed. Does no I/O besides reading the data, so it is safe to run
+    # in a worker process. The full price history is only loaded when include_history is set.
+    try:
+        print(f"Processing {crop_file}...")
+        
+        # Get crop name from file
+        crop_name = os.path.basename(crop_file).replace('.csv', '')
+        
+        # Summaries come from running statistics maintained by the price store at ingest/append
+        with metrics.stage("load"):
+            partition = load_partition(crop_file, directory)
+            stats = partition.stats(closest_market)
+        if stats is None:
+            print(f"No data for {crop_file} in market: {closest_market}")
+            return None
+        price_summary = stats.summary()
+        
+        # Monthly mean prices
+        monthly_df = stats.monthly_series()
         
+        # Basic statistics
+        current_price = price_summary['current_price']
+        avg_price = price_summary['avg_price']
+        min_price = price_summary['min_price']
+        max_price = price_summary['max_price']
+        price_volatility = price_summary['price_volatility']
+        
+        last_year_avg_price = price_summary['last_year_avg_price']
+        yoy_change = price_summary['yoy_change']
+        if np.isnan(yoy_change):
+            print(f"Warning: Could not calculate YoY change for {crop_name}")
+        
+        monthly_avg = price_summary['monthly_avg']
         try:
-            # Load dataset
-            print(f"Processing {crop_file}...")
-            df = pd.read_csv(file_path)
-            
-            # If available, filter by market name based on the closest market.
-            # if closest_market and "Market Name" in df.columns:
-            #     df = df[df["Market Name"] == closest_market]
-            #     if df.empty:
-            #         print(f"No data for {crop_file} in market: {closest_market}")
-            #         continue
-            
-            # Get crop name from file
-            crop_name = os.path.basename(crop_file).replace('.csv', '')
-            
-            # Convert 'Reported Date' column to DateTime format and set as index
-            df['Reported Date'] = pd.to_datetime(df['Reported Date'], errors='coerce')
-            
-            # Check for date parsing issues
-            if df['Reported Date'].isna().any():
-                print(f"Warning: Found invalid dates in {crop_name}. Trying alternative formats...")
-                for date_format in ["%d-%m-%Y", "%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y"]:
-                    try:
-                        df['Reported Date'] = pd.to_datetime(df['Reported Date'], format=date_format, errors='coerce')
-                        if not df['Reported Date'].isna().any():
-                            print(f"Successfully parsed dates using format: {date_format}")
-                            break
-                    except Exception:
-                        continue
-            
-            # Drop rows with invalid dates
-            df = df.dropna(subset=['Reported Date'])
-            if df.empty:
-                print(f"Error: No valid data for {crop_name} after date parsing")
-                continue
-                
-            df.set_index('Reported Date', inplace=True)
+            sowing_month = monthly_avg.idxmin()
+            harvest_month = monthly_avg.idxmax()
+            growth_duration = (harvest_month - sowing_month) % 12 or 12
             
-            # Handle missing price values
-            if 'Modal Price (Rs./Quintal)' not in df.columns:
-                print(f"Error: 'Modal Price (Rs./Quintal)' column not found in {crop_name}")
-                print(f"Available columns: {df.columns.tolist()}")
-                continue
-                
-            df['Modal Price (Rs./Quintal)'] = pd.to_numeric(df['Modal Price (Rs./Quintal)'], errors='coerce')
-            df = df.ffill().bfill()
-            df = df.sort_index()
-            
-            # Resample to monthly frequency
-            monthly_df = df['Modal Price (Rs./Quintal)'].resample('M').mean()
-            
-            # Calculate basic statistics
-            current_price = df['Modal Price (Rs./Quintal)'].iloc[-1]
-            avg_price = df['Modal Price (Rs./Quintal)'].mean()
-            min_price = df['Modal Price (Rs./Quintal)'].min()
-            max_price = df['Modal Price (Rs./Quintal)'].max()
-            price_volatility = df['Modal Price (Rs./Quintal)'].std() / avg_price * 100
-            
-            df['Year'] = df.index.year
-            df['Month'] = df.index.month
-            
-            try:
-                last_year = df['Year'].max() - 1
-                last_year_avg_price = df[df['Year'] == last_year]['Modal Price (Rs./Quintal)'].mean()
-                yoy_change = ((current_price - last_year_avg_price) / last_year_avg_price) * 100
-            except Exception:
-                last_year_avg_price = np.nan
-                yoy_change = np.nan
-                print(f"Warning: Could not calculate YoY change for {crop_name}")
-            
-            monthly_avg = df.groupby('Month')['Modal Price (Rs./Quintal)'].mean()
-            try:
-                sowing_month = monthly_avg.idxmin()
-                harvest_month = monthly_avg.idxmax()
-                growth_duration = (harvest_month - sowing_month) % 12 or 12
-                
-                month_names = {1: 'Jan', 2: 'Feb', 3: 'Mar', 4: 'Apr', 5: 'May', 6: 'Jun', 
-                               7: 'Jul', 8: 'Aug', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dec'}
-                sowing_month_name = month_names[sowing_month]
-                harvest_month_name = month_names[harvest_month]
-            except Exception:
-                sowing_month = sowing_month_name = harvest_month = harvest_month_name = np.nan
-                growth_duration = np.nan
-                print(f"Warning: Could not determine sowing/harvesting periods for {crop_name}")
-            
-            # Forecasting with SARIMA
-            try:
-                if len(monthly_df) < 24:
-                    print(f"Warning: Limited data for {crop_name} ({len(monthly_df)} months). Forecast may be less reliable.")
-                if len(monthly_df) > 36:
-                    order = (2, 1, 2)
-                    seasonal_order = (1, 1, 1, 12)
-                else:
-                    order = (1, 1, 1)
-                    seasonal_order = (1, 0, 0, 12)
-                
-                model = SARIMAX(monthly_df, order=order, seasonal_order=seasonal_order,
-                                enforce_stationarity=False, enforce_invertibility=False)
-                model_fit = model.fit(disp=False)
-                
-                forecast_steps = 12
-                future_dates = pd.date_range(start=monthly_df.index[-1], periods=forecast_steps + 1, freq='M')[1:]
-                forecast = model_fit.forecast(steps=forecast_steps)
-                
-                next_month_price = forecast.iloc[0]
-                six_month_price = forecast.iloc[5]
-                one_year_price = forecast.iloc[-1]
-                
-                short_term_change = ((next_month_price - current_price) / current_price) * 100
-                mid_term_change = ((six_month_price - current_price) / current_price) * 100
-                long_term_change = ((one_year_price - current_price) / current_price) * 100
-                
-                all_crops_forecast[crop_name] = {
-                    'dates': future_dates,
-                    'prices': forecast,
-                    'current_price': current_price
-                }
-                
-                # Create individual forecast plot
-                plt.figure(figsize=(12, 6))
-                plt.plot(df.index, df['Modal Price (Rs./Quintal)'], label="Historical Prices", color="#1f77b4", alpha=0.7)
-                plt.plot(future_dates, forecast, label="Forecasted Prices", color="#d62728", linestyle="dashed", linewidth=2)
-                confidence = 0.15
-                plt.fill_between(future_dates, forecast * (1 - confidence), forecast * (1 + confidence),
-                                 color="#d62728", alpha=0.2, label="Forecast Range (±15%)")
-                plt.xlabel("Date", fontsize=12)
-                plt.ylabel("Price (Rs./Quintal)", fontsize=12)
-                plt.title(f"{crop_name} Price History and Forecast", fontsize=14, fontweight='bold')
-                plt.grid(True, alpha=0.3)
-                plt.legend(loc="best")
-                plt.gcf().autofmt_xdate()
-                plt.annotate(f"Current: ₹{current_price:.0f}", 
-                             xy=(df.index[-1], current_price),
-                             xytext=(10, 20), textcoords="offset points",
-                             arrowprops=dict(arrowstyle="->", connectionstyle="arc3,rad=.2"))
-                plt.annotate(f"Forecast (1 yr): ₹{one_year_price:.0f} ({long_term_change:+.1f}%)", 
-                             xy=(future_dates[-1], one_year_price),
-                             xytext=(10, -30), textcoords="offset points",
-                             arrowprops=dict(arrowstyle="->", connectionstyle="arc3,rad=.2"))
-                plt.tight_layout()
-                plt.savefig(os.path.join(output_dir, f"{crop_name}_forecast.png"), dpi=300)
-                plt.close()
-            except Exception as model_error:
-                print(f"Forecasting error for {crop_name}: {model_error}")
-                next_month_price = six_month_price = one_year_price = np.nan
-                short_term_change = mid_term_change = long_term_change = np.nan
-                future_dates = forecast = None
-            
-            crop_summaries.append({
+            month_names = {1: 'Jan', 2: 'Feb', 3: 'Mar', 4: 'Apr', 5: 'May', 6: 'Jun', 
+                           7: 'Jul', 8: 'Aug', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dec'}
+            sowing_month_name = month_names[sowing_month]
+            harvest_month_name = month_names[harvest_month]
+        except Exception:
+            sowing_month = sowing_month_name = harvest_month = harvest_month_name = np.nan
+            growth_duration = np.nan
+            print(f"Warning: Could not determine sowing/harvesting periods for {crop_name}")
+        
+        record = {
+            'crop': crop_name,
+            'market': closest_market,
+            'version': partition.fingerprint,
+            'monthly': monthly_df,
+            'current_price': current_price,
+            'summary': {
                 "Crop": crop_name,
                 "Current Price": round(current_price, 2),
                 "Avg Price": round(avg_price, 2),
@@ -237,102 +141,374 @@ def get_market(user_lat=None, user_lon=None):
                 "Harvest Month": harvest_month_name,
                 "Growth Duration (Months)": growth_duration,
                 "Last Year Avg Price": round(last_year_avg_price, 2),
-                "YoY Change (%)": round(yoy_change, 2),
-                "Forecasted Price (Next Month)": round(next_month_price, 2),
-                "Forecasted Price (6 Months)": round(six_month_price, 2),
-                "Forecasted Price (1 Year)": round(one_year_price, 2),
-                "Short Term Trend (%)": round(short_term_change, 2),
-                "Mid Term Trend (%)": round(mid_term_change, 2),
-                "Long Term Trend (%)": round(long_term_change, 2)
-            })
-            
-            if not np.isnan(short_term_change) and not np.isnan(mid_term_change) and not np.isnan(long_term_change):
-                price_change_data.append({
-                    "Crop": crop_name,
-                    "1 Month": short_term_change,
-                    "6 Months": mid_term_change,
-                    "12 Months": long_term_change
-                })
+                "YoY Change (%)": round(yoy_change, 2)
+            },
+            'history': partition.series(closest_market) if include_history else None
+        }
         
+        # Forecasting with SARIMA; the fast mode forecasts all records in one batch afterwards
+        forecast = None
+        if mode == 'sarimax':
+            try:
+                forecast = sarimax_forecast(record)
+            except Exception as model_error:
+                print(f"Forecasting error for {crop_name}: {model_error}")
+        return apply_forecast(record, forecast)
+    
+    except Exception as e:
+        print(f"Error processing {crop_file}: {e}")
+        return None
+
+def forecast_dates(monthly_df):
+    return pd.date_range(start=monthly_df.index[-1], periods=forecast_steps + 1, freq='M')[1:]
+
+def sarimax_forecast(record):
+    crop_name = record['crop']
+    monthly_df = record['monthly']
+    if len(monthly_df) < 24:
+        print(f"Warning: Limited data for {crop_name} ({len(monthly_df)} months). Forecast may be less reliable.")
+    # Orders picked offline by backtest.py, falling back to the length-based rule
+    order, seasonal_order = selected_orders(crop_name, record['market'], len(monthly_df))
+    
+    # Only refit when the crop's data (or the chosen orders) changed
+    cache_key = forecast_key(record['version'], order, seasonal_order, forecast_steps, record['market'])
+    forecast = load_forecast(cache_key)
+    if forecast is None:
+        with metrics.stage("sarimax_fit"):
+            model_fit = fit_sarimax(record, order, seasonal_order)
+        with metrics.stage("sarimax_forecast"):
+            forecast = model_fit.forecast(steps=forecast_steps)
+        save_forecast(cache_key, forecast)
+    return forecast
+
+def fit_sarimax(record, order, seasonal_order):
+    # Fit a series' SARIMAX model, reusing the parameters saved from its previous fit
+    # (statsmodels is imported here so only the SARIMAX path pays for it)
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    monthly_df = record['monthly']
+    state_key = model_state_key(record['crop'], record['market'], order, seasonal_order)
+    state = load_model_state(state_key)
+    model = SARIMAX(monthly_df, order=order, seasonal_order=seasonal_order,
+                    enforce_stationarity=False, enforce_invertibility=False)
+
+    start_params = None
+    if state is not None and len(state['params']) == len(model.start_params):
+        # Only data appended after the saved series (or revising its last month) counts as an update
+        start_params = state['params']
+        same_history = (state['start'] == monthly_df.index[0] and len(monthly_df) >= state['nobs'])
+        if same_history and state['updates'] < sarimax_refit_every:
+            # Same as results.append(new_data, refit=False): run the Kalman filter over the
+            # extended series with the fitted parameters, no optimization
+            model_fit = model.filter(start_params)
+            state['nobs'] = len(monthly_df)
+            state['updates'] += 1
+            save_model_state(state_key, state)
+            return model_fit
+
+    model_fit = model.fit(start_params=start_params, disp=False)
+    save_model_state(state_key, {
+        'params': np.asarray(model_fit.params),
+        'start': monthly_df.index[0],
+        'nobs': len(monthly_df),
+        'updates': 0,
+    })
+    return model_fit
+
+def apply_forecast(record, forecast):
+    # Fill in the record's forecast fields from a forecast series (None when forecasting failed)
+    current_price = record['current_price']
+    record['forecast'] = None
+    if forecast is not None:
+        next_month_price = forecast.iloc[0]
+        six_month_price = forecast.iloc[5]
+        one_year_price = forecast.iloc[-1]
+        
+        short_term_change = ((next_month_price - current_price) / current_price) * 100
+        mid_term_change = ((six_month_price - current_price) / current_price) * 100
+        long_term_change = ((one_year_price - current_price) / current_price) * 100
+        
+        record['forecast'] = {
+            'dates': forecast_dates(record['monthly']),
+            'prices': forecast,
+            'current_price': current_price
+        }
+    else:
+        next_month_price = six_month_price = one_year_price = np.nan
+        short_term_change = mid_term_change = long_term_change = np.nan
+    
+    record['summary'].update({
+        "Forecasted Price (Next Month)": round(next_month_price, 2),
+        "Forecasted Price (6 Months)": round(six_month_price, 2),
+        "Forecasted Price (1 Year)": round(one_year_price, 2),
+        "Short Term Trend (%)": round(short_term_change, 2),
+        "Mid Term Trend (%)": round(mid_term_change, 2),
+        "Long Term Trend (%)": round(long_term_change, 2)
+    })
+    
+    record['price_change'] = None
+    if not np.isnan(short_term_change) and not np.isnan(mid_term_change) and not np.isnan(long_term_change):
+        record['price_change'] = {
+            "Crop": record['crop'],
+            "1 Month": short_term_change,
+            "6 Months": mid_term_change,
+            "12 Months": long_term_change
+        }
+    return record
+
+def _run_crop(crop_file, closest_market, mode):
+    return analyze_crop(crop_file, closest_market, mode=mode)
+
+def _run_crop_worker(crop_file, closest_market, mode):
+    # Worker entry point; stage timings travel back with the record
+    with metrics.capture() as timings:
+        record = _run_crop(crop_file, closest_market, mode)
+    return record, timings
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    global _executor
+    if analysis_workers <= 1:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=analysis_workers)
+        return _executor
+
+def reset_executor(broken):
+    # Drop a pool whose worker died so the next submit starts a fresh one
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            print("Analysis worker pool is broken, starting a new one")
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def submit_crop(crop_file, closest_market, mode):
+    # (pool, future) for one crop's analysis, or None when it cannot be submitted; a broken
+    # pool is replaced once
+    for attempt in range(2):
+        executor = get_executor()
+        try:
+            return executor, executor.submit(_run_crop_worker, crop_file, closest_market, mode)
+        except (BrokenProcessPool, RuntimeError) as e:
+            reset_executor(executor)
+            error = e
+    print(f"Error processing {crop_file}: {error}")
+    return None
+
+def crop_result(submitted, crop_file, closest_market, mode):
+    # A submitted crop's record (None when it failed). A worker crash breaks the whole pool
+    # and fails every pending crop, so those crops are retried once on a fresh pool
+    for attempt in range(2):
+        if submitted is None:
+            return None
+        executor, future = submitted
+        try:
+            record, timings = future.result()
+        except BrokenProcessPool as e:
+            reset_executor(executor)
+            if attempt == 0:
+                submitted = submit_crop(crop_file, closest_market, mode)
+                continue
+            print(f"Error processing {crop_file}: {e}")
+            return None
         except Exception as e:
             print(f"Error processing {crop_file}: {e}")
+            return None
+        for name, seconds in timings:
+            metrics.record_stage(name, seconds)
+        return record
+
+def run_market_analyses(files, markets, mode=None):
+    # Analyze every (market, crop) pair in the process pool (or serially with a single
+    # worker) and return {market: records}, keeping the crop order of files
+    mode = mode or forecast_mode
+    tasks = [(market, crop_file) for market in markets for crop_file in files]
+    executor = get_executor()
+    if executor is None:
+        results = [_run_crop(crop_file, market, mode) for market, crop_file in tasks]
+    else:
+        submitted = [submit_crop(crop_file, market, mode) for market, crop_file in tasks]
+        results = [crop_result(task, crop_file, market, mode)
+                   for (market, crop_file), task in zip(tasks, submitted)]
+
+    if mode == 'fast':
+        # Fit every crop x market monthly series in one vectorized pass
+        analyzed = [record for record in results if record is not None]
+        with metrics.stage("fast_forecast"):
+            forecasts = batch_forecast([record['monthly'] for record in analyzed], forecast_steps)
+        for record, forecast in zip(analyzed, forecasts):
+            if forecast is None:
+                print(f"Forecasting error for {record['crop']}: not enough monthly data")
+            apply_forecast(record, forecast)
+
+    records = {market: [] for market in markets}
+    for (market, _), record in zip(tasks, results):
+        if record is not None:
+            records[market].append(record)
+    return records
+
+def run_crop_analyses(files, closest_market, mode=None):
+    return run_market_analyses(files, [closest_market], mode)[closest_market]
+
+def iter_crop_analyses(files, closest_market, mode=None):
+    # Yield each crop's record as soon as it is ready (completion order, failed crops skipped);
+    # in fast mode every record is forecast on its own as it arrives
+    mode = mode or forecast_mode
+    executor = get_executor()
+    if executor is None:
+        results = (_run_crop(crop_file, closest_market, mode) for crop_file in files)
+    else:
+        futures = {}
+        for crop_file in files:
+            submitted = submit_crop(crop_file, closest_market, mode)
+            if submitted is not None:
+                futures[submitted[1]] = (submitted[0], crop_file)
+
+        def collect():
+            for future in as_completed(futures):
+                executor, crop_file = futures[future]
+                yield crop_result((executor, future), crop_file, closest_market, mode)
+        results = collect()
+
+    for record in results:
+        if record is None:
+            continue
+        if mode == 'fast':
+            with metrics.stage("fast_forecast"):
+                forecast = batch_forecast([record['monthly']], forecast_steps)[0]
+            if forecast is None:
+                print(f"Forecasting error for {record['crop']}: not enough monthly data")
+            apply_forecast(record, forecast)
+        yield record
+
+def stream_market_analysis(closest_market, mode=None):
+    # NDJSON lines: one {"type": "crop"} line per crop as it completes, then the
+    # {"type": "summary"} line holding the same report as the non-streaming response
+    files = active_crop_files()
+    print(f"Streaming analysis of {len(files)} crops...")
+    records = []
+    for record in iter_crop_analyses(files, closest_market, mode):
+        records.append(record)
+        summary = pd.DataFrame([record['summary']]).to_dict(orient='records')[0]
+        yield app.json.dumps({"type": "crop", "market": closest_market or 'All Markets', **summary}) + "\n"
+
+    # The report lists crops in registry order, whatever order they finished in
+    order = {os.path.basename(crop_file).replace('.csv', ''): i for i, crop_file in enumerate(files)}
+    records.sort(key=lambda record: order.get(record['crop'], len(order)))
+    with metrics.stage("report"):
+        report = market_report(closest_market, records)
+    yield app.json.dumps({"type": "summary", **report}) + "\n"
+
+def market_has_data(market):
+    return any(load_partition(crop_file, directory).has_market(market) for crop_file in active_crop_files())
+
+def analysis_market(closest_market):
+    # Market whose prices are analyzed for a resolved closest market (None means all markets)
+    if not closest_market or not filter_by_market:
+        return None
+    if not market_has_data(closest_market):
+        print(f"No price data for market {closest_market}, using all markets")
+        return None
+    return closest_market
+
+def resolve_market(user_lat=None, user_lon=None):
+    # If latitude and longitude are provided, determine the closest market name.
+    closest_market = None
+    if user_lat is not None and user_lon is not None:
+        try:
+            closest_market = get_closest_market(float(user_lat), float(user_lon))
+            print(f"Closest market based on provided coordinates: {closest_market}")
+        except Exception as e:
+            print(f"Error determining closest market: {e}")
+    return analysis_market(closest_market)
+
+def market_data_fingerprint(closest_market, mode=None):
+    # Identifies the inputs of an analysis: the market, the forecasting mode and the version
+    # of every crop's data
+    parts = [(crop_file, load_partition(crop_file, directory).fingerprint) for crop_file in active_crop_files()]
+    return hashlib.sha1(repr((closest_market, mode or forecast_mode, parts)).encode("utf-8")).hexdigest()
+
+def market_data_modified():
+    # Time of the most recent price data update across all crops
+    stamp = max(load_partition(crop_file, directory).stamp or 0 for crop_file in active_crop_files())
+    return pd.Timestamp(stamp, unit='ns', tz='UTC').to_pydatetime()
+
+def summarize_records(records):
+    # Store results for analysis and comparison
+    crop_summaries = [record['summary'] for record in records]
+    price_change_data = [record['price_change'] for record in records if record['price_change'] is not None]
+    all_crops_forecast = {record['crop']: record['forecast'] for record in records if record['forecast'] is not None}
 
     summary_df = pd.DataFrame(crop_summaries)
+    if summary_df.empty:
+        return summary_df, price_change_data, all_crops_forecast
     summary_df = summary_df.sort_values(by="Forecasted Price (Next Month)", ascending=False)
-    summary_csv_path = os.path.join(output_dir, "crop_analysis_summary.csv")
-    summary_df.to_csv(summary_csv_path, index=False)
-    print(f"\nComplete analysis saved to {summary_csv_path}")
-
-    if crop_summaries:
-        # Generate visualizations
-        plt.figure(figsize=(14, 8))
-        viz_df = summary_df[["Crop", "Current Price", "Forecasted Price (Next Month)"]]
-        viz_df = viz_df.sort_values(by="Current Price", ascending=False)
-        viz_df.plot(x="Crop", y=["Current Price", "Forecasted Price (Next Month)"], 
-                    kind="bar", color=["#1f77b4", "#d62728"], alpha=0.7, ax=plt.gca())
-        plt.title("Current vs. Forecasted Prices (Next Month)", fontsize=16, fontweight='bold')
-        plt.ylabel("Price (Rs./Quintal)", fontsize=12)
-        plt.xlabel("", fontsize=12)
-        plt.xticks(rotation=45, ha='right')
-        plt.grid(axis='y', alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, "price_comparison.png"), dpi=300)
-        plt.close()
-        
-        if price_change_data:
-            trend_df = pd.DataFrame(price_change_data)
-            trend_df = trend_df.sort_values(by="12 Months", ascending=False)
-            plt.figure(figsize=(14, 8))
-            trend_df.plot(x="Crop", y=["1 Month", "6 Months", "12 Months"], 
-                          kind="bar", color=["#1f77b4", "#ff7f0e", "#2ca02c"], ax=plt.gca())
-            plt.title("Forecasted Price Change by Timeframe", fontsize=16, fontweight='bold')
-            plt.ylabel("Price Change (%)", fontsize=12)
-            plt.xlabel("", fontsize=12)
-            plt.axhline(y=0, color='r', linestyle='-', alpha=0.3)
-            plt.xticks(rotation=45, ha='right')
-            plt.grid(axis='y', alpha=0.3)
-            plt.tight_layout()
-            plt.savefig(os.path.join(output_dir, "price_trends.png"), dpi=300)
-            plt.close()
-        
-        plt.figure(figsize=(14, 8))
-        top_crops = summary_df.sort_values(by="Long Term Trend (%)", ascending=False).head(5)["Crop"].tolist()
-        for crop in top_crops:
-            if crop in all_crops_forecast:
-                data = all_crops_forecast[crop]
-                current = data['current_price']
-                normalized_forecast = [(price/current)*100 for price in data['prices']]
-                plt.plot(data['dates'], normalized_forecast, label=crop, linewidth=2)
-        plt.title("Top 5 Crops - Comparative Price Forecast (% Change)", fontsize=16, fontweight='bold')
-        plt.ylabel("Price (% of Current)", fontsize=12)
-        plt.xlabel("Date", fontsize=12)
-        plt.grid(True, alpha=0.3)
-        plt.legend(loc="best")
-        plt.gcf().autofmt_xdate()
-        plt.axhline(y=100, color='black', linestyle='--', alpha=0.5, label='Current Price Level')
-        plt.gca().yaxis.set_major_formatter(ticker.PercentFormatter())
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, "comparative_forecast.png"), dpi=300)
-        plt.close()
-        
-        plt.figure(figsize=(12, 8))
-        growth_df = summary_df.dropna(subset=["Growth Duration (Months)"])
-        if not growth_df.empty:
-            plt.scatter(growth_df["Growth Duration (Months)"], 
-                        growth_df["Forecasted Price (Next Month)"],
-                        s=100, alpha=0.7)
-            for idx, row in growth_df.iterrows():
-                plt.annotate(row["Crop"], 
-                             (row["Growth Duration (Months)"], row["Forecasted Price (Next Month)"]),
-                             xytext=(5, 5), textcoords="offset points")
-            plt.title("Relationship Between Growth Duration and Price", fontsize=16, fontweight='bold')
-            plt.xlabel("Growth Duration (Months)", fontsize=12)
-            plt.ylabel("Forecasted Price (Rs./Quintal)", fontsize=12)
-            plt.grid(True, alpha=0.3)
-            plt.tight_layout()
-            plt.savefig(os.path.join(output_dir, "growth_vs_price.png"), dpi=300)
-            plt.close()
-        
+    return summary_df, price_change_data, all_crops_forecast
+
+def get_market(user_lat=None, user_lon=None, mode=None):
+    return market_analysis(resolve_market(user_lat, user_lon), mode)
+
+def market_analysis(closest_market, mode=None):
+    files = active_crop_files()
+    print(f"Starting analysis of {len(files)} crops...")
+    records = run_crop_analyses(files, closest_market, mode)
+    with metrics.stage("report"):
+        return market_report(closest_market, records)
+
+def get_markets_batch(points, mode=None):
+    # Resolve all points in one vectorized nearest-market query, then analyze each distinct
+    # market once; cost scales with the number of markets rather than the number of farms
+    lats = np.array([point[0] for point in points], dtype=float)
+    lons = np.array([point[1] for point in points], dtype=float)
+    names, distances = get_market_index(market_lat_long_file).nearest_many(lats, lons)
+
+    resolved = {name: analysis_market(name) for name in dict.fromkeys(names)}
+    markets = list(dict.fromkeys(resolved.values()))
+    files = active_crop_files()
+    print(f"Starting analysis of {len(files)} crops for {len(markets)} markets ({len(points)} points)...")
+    records = run_market_analyses(files, markets, mode)
+
+    reports = {}
+    for market in markets:
+        try:
+            reports[market or 'All Markets'] = market_report(market, records[market])
+        except Exception as e:
+            print(f"Error building report for {market or 'All Markets'}: {e}")
+            reports[market or 'All Markets'] = None
+
+    results = []
+    for lat, lon, name, distance in zip(lats, lons, names, distances):
+        results.append({
+            "lat": float(lat),
+            "lon": float(lon),
+            "closest_market": name,
+            "distance_km": round(float(distance), 3),
+            "analysis": resolved[name] or 'All Markets'
+        })
+    return {"results": results, "markets": reports}
+
+def export_summary(closest_market=None, path=None, mode=None):
+    # Write the crop summary table to a CSV. Requests never write files; this is a separate
+    # export step (python market_flask.py --export-summary)
+    path = path or os.path.join("output", "crop_analysis_summary.csv")
+    records = run_crop_analyses(active_crop_files(), closest_market, mode)
+    summary_df, _, _ = summarize_records(records)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    summary_df.to_csv(path, index=False)
+    print(f"\nComplete analysis saved to {path}")
+    return path
+
+def market_report(closest_market, records):
+    output = {}
+
+    summary_df, price_change_data, all_crops_forecast = summarize_records(records)
+
+    # Charts are rendered on demand by the /chart endpoint
+    if not summary_df.empty:
         # Executive summary values
         best_price = summary_df.loc[summary_df["Forecasted Price (Next Month)"].idxmax()]
         worst_price = summary_df.loc[summary_df["Forecasted Price (Next Month)"].idxmin()]
@@ -436,13 +612,175 @@ def get_market(user_lat=None, user_lon=None):
 app = Flask(__name__)
 
 CORS(app, resources={r"/*": {"origins": "*"}}) 
+metrics.install(app)
+
+# In-memory cache of rendered /get_market responses
+response_cache = ResponseCache()
+
+def warm_forecast_cache():
+    # Fit (or load) every forecast a request can resolve to, so first requests are served
+    # from the cache: the all-markets view and each indexed market with price data
+    print("Warming forecast cache...")
+    try:
+        names = get_market_index(market_lat_long_file).names
+        markets = [None] + [market for market in dict.fromkeys(analysis_market(name) for name in names)
+                            if market is not None]
+        print(f"Warming forecasts for {len(markets)} markets...")
+        run_market_analyses(active_crop_files(), markets)
+    except Exception as e:
+        print(f"Error warming forecast cache: {e}")
 
 @app.route('/get_market', methods=['GET'])
 def market_insight():
     user_lat = request.args.get('lat')
     user_lon = request.args.get('lon')
-    result = get_market(user_lat, user_lon)
-    return jsonify(result)
+    mode = request.args.get('mode', forecast_mode)
+    if mode not in forecast_modes:
+        return jsonify({"error": f"Unknown forecasting mode: {mode}"}), 400
+    stream = request.args.get('stream', '0') not in ('0', 'false', '')
+    if stream or request.accept_mimetypes.best == 'application/x-ndjson':
+        closest_market = resolve_market(user_lat, user_lon)
+        return Response(stream_with_context(stream_market_analysis(closest_market, mode)),
+                        mimetype='application/x-ndjson')
+    # Requests resolving to the same market share one cached (and single-flighted) response
+    # until any crop's data changes
+    closest_market = resolve_market(user_lat, user_lon)
+    key = market_data_fingerprint(closest_market, mode)
+    def compute():
+        result = market_analysis(closest_market, mode)
+        with metrics.stage("serialize"):
+            return app.json.dumps(result).encode("utf-8")
+    return cached_response(response_cache, request, key, compute, market_data_modified())
+
+@app.route('/get_market/batch', methods=['POST'])
+def market_insight_batch():
+    mode = request.args.get('mode', forecast_mode)
+    if mode not in forecast_modes:
+        return jsonify({"error": f"Unknown forecasting mode: {mode}"}), 400
+    payload = request.get_json(silent=True)
+    points = payload.get('points') if isinstance(payload, dict) else payload
+    if not isinstance(points, list) or not points:
+        return jsonify({"error": "Expected a JSON list of points"}), 400
+    if len(points) > max_batch_points:
+        return jsonify({"error": f"At most {max_batch_points} points per request"}), 400
+    try:
+        points = [(float(point['lat']), float(point['lon'])) if isinstance(point, dict)
+                  else (float(point[0]), float(point[1])) for point in points]
+    except (KeyError, IndexError, TypeError, ValueError):
+        return jsonify({"error": "Each point needs numeric lat and lon"}), 400
+    # float() accepts "nan" and "inf", which the market and raster lookups cannot place
+    if not all(math.isfinite(lat) and math.isfinite(lon) for lat, lon in points):
+        return jsonify({"error": "Each point needs finite lat and lon"}), 400
+    return jsonify(get_markets_batch(points, mode))
+
+@app.route('/prices/<crop>', methods=['POST'])
+def add_prices(crop):
+    # Append new mandi prices ({"market", "date", "price"} rows) to a crop's series
+    crop_file = f"{crop}.csv"
+    if crop_file not in active_crop_files():
+        return jsonify({"error": f"Unknown crop: {crop}"}), 404
+    payload = request.get_json(silent=True)
+    rows = payload.get('rows') if isinstance(payload, dict) else payload
+    if not isinstance(rows, list) or not rows:
+        return jsonify({"error": "Expected a JSON list of rows"}), 400
+    try:
+        partition = append_prices(crop_file, rows, directory)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"crop": crop, "rows": len(partition), "version": partition.fingerprint})
+
+@app.route('/nearby_markets', methods=['GET'])
+def nearby_markets():
+    user_lat = request.args.get('lat', type=float)
+    user_lon = request.args.get('lon', type=float)
+    if user_lat is None or user_lon is None:
+        return jsonify({"error": "Missing lat or lon parameters"}), 400
+    if not (math.isfinite(user_lat) and math.isfinite(user_lon)):
+        return jsonify({"error": "lat and lon must be finite numbers"}), 400
+    index = get_market_index(market_lat_long_file)
+    radius_km = request.args.get('radius_km', type=float)
+    k = request.args.get('k', default=5, type=int)
+    if radius_km is not None:
+        if not (math.isfinite(radius_km) and radius_km >= 0):
+            return jsonify({"error": "radius_km must be a non-negative number"}), 400
+        matches = index.within_radius(user_lat, user_lon, radius_km)
+    elif k < 1:
+        return jsonify({"error": "k must be a positive integer"}), 400
+    else:
+        matches = index.nearest(user_lat, user_lon, k=k)
+    return jsonify([{"market": name, "distance_km": round(dist, 3)} for name, dist in matches])
+
+def build_chart(chart_name, closest_market, crop=None, mode=None):
+    # Returns (plot function, arguments) for one chart, or None when there is nothing to draw
+    mode = mode or forecast_mode
+    if chart_name == 'forecast':
+        crop_file = f"{crop}.csv"
+        if crop_file not in active_crop_files():
+            return None
+        record = analyze_crop(crop_file, closest_market, include_history=True, mode=mode)
+        if record is not None and mode == 'fast':
+            apply_forecast(record, batch_forecast([record['monthly']], forecast_steps)[0])
+        if record is None or record['forecast'] is None:
+            return None
+        return plot_crop_forecast, (record,)
+
+    records = run_crop_analyses(active_crop_files(), closest_market, mode)
+    if not records:
+        return None
+    summary_df, price_change_data, all_crops_forecast = summarize_records(records)
+    if chart_name == 'price_comparison':
+        return plot_price_comparison, (summary_df,)
+    if chart_name == 'price_trends':
+        return (plot_price_trends, (price_change_data,)) if price_change_data else None
+    if chart_name == 'comparative_forecast':
+        return plot_comparative_forecast, (summary_df, all_crops_forecast)
+    if chart_name == 'growth_vs_price':
+        growth_df = summary_df.dropna(subset=["Growth Duration (Months)"])
+        return (plot_growth_vs_price, (growth_df,)) if not growth_df.empty else None
+    return None
+
+@app.route('/chart/<chart_name>', methods=['GET'])
+def chart(chart_name):
+    if chart_name not in chart_sizes:
+        return jsonify({"error": f"Unknown chart: {chart_name}"}), 404
+    fmt = request.args.get('format', 'png').lower()
+    if fmt not in chart_formats:
+        return jsonify({"error": f"Unsupported format: {fmt}"}), 400
+    default_width, default_height = chart_sizes[chart_name]
+    width = request.args.get('width', default=default_width, type=float)
+    height = request.args.get('height', default=default_height, type=float)
+    dpi = request.args.get('dpi', default=default_dpi, type=int)
+    if not (0 < width <= max_inches and 0 < height <= max_inches and 0 < dpi <= max_dpi):
+        return jsonify({"error": f"Size must be at most {max_inches} in and dpi at most {max_dpi}"}), 400
+    crop = request.args.get('crop')
+    if chart_name == 'forecast' and not crop:
+        return jsonify({"error": "Missing crop parameter"}), 400
+    mode = request.args.get('mode', forecast_mode)
+    if mode not in forecast_modes:
+        return jsonify({"error": f"Unknown forecasting mode: {mode}"}), 400
+
+    closest_market = resolve_market(request.args.get('lat'), request.args.get('lon'))
+    key = chart_key(chart_name, market_data_fingerprint(closest_market, mode), crop, width, height, dpi, fmt)
+    data = load_chart(key, fmt)
+    if data is None:
+        chart_spec = build_chart(chart_name, closest_market, crop, mode)
+        if chart_spec is None:
+            return jsonify({"error": "No data available for this chart"}), 404
+        plot, args = chart_spec
+        with metrics.stage("plot"):
+            data = render_chart(plot, args, width, height, dpi, fmt)
+        save_chart(key, fmt, data)
+    return Response(data, mimetype=chart_formats[fmt])
 
 if __name__ == '__main__':
-    app.run(debug=True, port=2000)
+    parser = argparse.ArgumentParser(description="Market analysis API")
+    parser.add_argument("--export-summary", nargs="?", const=os.path.join("output", "crop_analysis_summary.csv"),
+                        metavar="CSV", help="write the crop summary table to a CSV and exit")
+    parser.add_argument("--lat", type=float, help="analyze the market closest to this point (with --lon)")
+    parser.add_argument("--lon", type=float)
+    args = parser.parse_args()
+    if args.export_summary:
+        export_summary(resolve_market(args.lat, args.lon), args.export_summary)
+    else:
+        warm_forecast_cache()
+        app.run(debug=True, port=2000)
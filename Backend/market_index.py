@@ -0,0 +1,95 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    # Vectorized great circle distance (in kilometers); arguments broadcast like NumPy arrays
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    dphi = lat2 - lat1
+    dlambda = lon2 - lon1
+    a = np.sin(dphi / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def to_unit_vectors(lat, lon):
+    # Map lat/lon (degrees) onto points of the unit sphere so euclidean (chord) distance
+    # orders points exactly like great circle distance does
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def km_to_chord(distance_km):
+    angle = np.minimum(np.asarray(distance_km, dtype=float) / EARTH_RADIUS_KM, np.pi)
+    return 2 * np.sin(angle / 2)
+
+
+class MarketIndex:
+    # KD-tree over market coordinates on the unit sphere
+
+    def __init__(self, names, lats, lons):
+        self.names = np.asarray(names, dtype=object)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.tree = cKDTree(to_unit_vectors(self.lats, self.lons))
+
+    @classmethod
+    def from_csv(cls, path):
+        market_df = pd.read_csv(path)
+        # Drop rows with missing lat or lon
+        market_df = market_df.dropna(subset=["Latitude", "Longitude"])
+        return cls(market_df["Market Name"].values, market_df["Latitude"].values, market_df["Longitude"].values)
+
+    def __len__(self):
+        return len(self.names)
+
+    def query(self, lats, lons, k=1):
+        # Returns (indices, distances in km), both shaped (n_points, k)
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        points = to_unit_vectors(np.atleast_1d(lats), np.atleast_1d(lons))
+        k = min(k, len(self))
+        _, idx = self.tree.query(points, k=k)
+        idx = np.asarray(idx).reshape(len(points), k)
+        dist = haversine_np(np.atleast_1d(lats)[:, None], np.atleast_1d(lons)[:, None],
+                            self.lats[idx], self.lons[idx])
+        return idx, dist
+
+    def nearest(self, lat, lon, k=1):
+        idx, dist = self.query(lat, lon, k=k)
+        return [(self.names[i], float(d)) for i, d in zip(idx[0], dist[0])]
+
+    def nearest_many(self, lats, lons):
+        # Closest market name and distance for every point in one vectorized pass
+        idx, dist = self.query(lats, lons, k=1)
+        return self.names[idx[:, 0]], dist[:, 0]
+
+    def within_radius(self, lat, lon, radius_km):
+        point = to_unit_vectors(lat, lon)
+        idx = np.asarray(self.tree.query_ball_point(point, km_to_chord(radius_km)), dtype=int)
+        dist = haversine_np(lat, lon, self.lats[idx], self.lons[idx])
+        order = np.argsort(dist, kind="stable")
+        # Chord radius is exact on the sphere; the filter only guards against float rounding
+        return [(self.names[idx[i]], float(dist[i])) for i in order if dist[i] <= radius_km]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_market_index(path):
+    # Build each index once per process and reuse it for every request
+    index = _indexes.get(path)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(path)
+            if index is None:
+                index = MarketIndex.from_csv(path)
+                _indexes[path] = index
+    return index
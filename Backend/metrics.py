@@ -0,0 +1,117 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, request
+
+# Lightweight in-process metrics: per-stage duration histograms, exposed in the Prometheus
+# text format on /metrics and per request in a Server-Timing header
+
+# Histogram bucket upper bounds in seconds
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    def __init__(self, name, help_text, label, buckets=default_buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label value -> [bucket counts..., sum, count]
+        self._series = {}
+
+    def observe(self, label_value, seconds):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((value, list(series)) for value, series in self._series.items())
+        for value, series in items:
+            label = f'{self.label}="{value}"'
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{label}}} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{{{label}}} {series[-1]}')
+        return "\n".join(lines)
+
+
+stage_seconds = Histogram("stage_duration_seconds", "Time spent in each processing stage.", "stage")
+request_seconds = Histogram("http_request_duration_seconds", "Time spent serving each endpoint.", "endpoint")
+
+# Stage timings of the request (or capture block) running on this thread
+_local = threading.local()
+
+
+def record_stage(name, seconds):
+    # Observe a stage duration, also used for timings measured in worker processes
+    stage_seconds.observe(name, seconds)
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+@contextmanager
+def capture():
+    # Collect the stage timings recorded on this thread, e.g. in a worker process so they
+    # can be sent back to the parent and replayed with record_stage
+    previous = getattr(_local, 'timings', None)
+    _local.timings = timings = []
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
+
+def server_timing(timings):
+    # Durations of repeated stages are summed; Server-Timing durations are in milliseconds
+    totals = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+def install(app):
+    # Time every request, add its Server-Timing header and serve /metrics
+    @app.before_request
+    def start_request_timer():
+        _local.timings = []
+        _local.request_start = time.perf_counter()
+
+    @app.after_request
+    def add_server_timing(response):
+        timings = getattr(_local, 'timings', None) or []
+        start = getattr(_local, 'request_start', None)
+        if start is not None:
+            elapsed = time.perf_counter() - start
+            request_seconds.observe(request.endpoint or "unknown", elapsed)
+            timings = timings + [("total", elapsed)]
+        if timings:
+            response.headers['Server-Timing'] = server_timing(timings)
+        _local.timings = None
+        _local.request_start = None
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        body = "\n".join([stage_seconds.exposition(), request_seconds.exposition()]) + "\n"
+        return Response(body, mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+
+def _month_index(dates):
+    # Months since 1970-01 for datetime64 dates
+    return np.asarray(dates, dtype='datetime64[M]').astype(np.int64)
+
+
+class RunningPriceStats:
+    # Aggregates behind a crop's market summary, maintained incrementally as prices arrive:
+    # count/mean/M2 (Welford), min/max, the latest observation and sum/count per calendar
+    # month (which also gives the per-year and per-month-of-year averages)
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        # Ordering key (days since epoch, tie-break) and price of the latest observation
+        self.last_key = None
+        self.last_price = np.nan
+        self.months = {}
+
+    def update(self, dates, prices, tie_breaks=None):
+        # Fold a batch of observations in; the order of equal (date, tie_break) keys decides
+        # which one becomes the latest observation, as in a stable sort
+        prices = np.asarray(prices, dtype=np.float64)
+        if len(prices) == 0:
+            return self
+        days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+        if tie_breaks is None:
+            tie_breaks = np.zeros(len(days), dtype=np.int64)
+
+        # Chan et al. parallel combination of the running mean/M2 with the batch's
+        n_b = len(prices)
+        mean_b = prices.mean()
+        m2_b = ((prices - mean_b) ** 2).sum()
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * self.count * n_b / n
+        self.count = n
+        self.min = min(self.min, float(prices.min()))
+        self.max = max(self.max, float(prices.max()))
+
+        keys = np.stack([days, np.asarray(tie_breaks, dtype=np.int64)], axis=1)
+        order = np.lexsort((keys[:, 1], keys[:, 0]))
+        latest = order[-1]
+        latest_key = (int(keys[latest, 0]), int(keys[latest, 1]))
+        if self.last_key is None or latest_key >= self.last_key:
+            self.last_key = latest_key
+            self.last_price = float(prices[latest])
+
+        month_idx = _month_index(np.asarray(dates, dtype='datetime64[D]'))
+        unique_months, inverse = np.unique(month_idx, return_inverse=True)
+        sums = np.bincount(inverse, weights=prices)
+        counts = np.bincount(inverse)
+        for month, total, cnt in zip(unique_months.tolist(), sums.tolist(), counts.tolist()):
+            acc = self.months.setdefault(month, [0.0, 0])
+            acc[0] += total
+            acc[1] += cnt
+        return self
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'm2': self.m2,
+            'min': self.min,
+            'max': self.max,
+            'last_key': self.last_key,
+            'last_price': self.last_price,
+            'months': {str(month): acc for month, acc in self.months.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count = data['count']
+        stats.mean = data['mean']
+        stats.m2 = data['m2']
+        stats.min = data['min']
+        stats.max = data['max']
+        stats.last_key = tuple(data['last_key']) if data['last_key'] is not None else None
+        stats.last_price = data['last_price']
+        stats.months = {int(month): list(acc) for month, acc in data['months'].items()}
+        return stats
+
+    def _month_frame(self):
+        months = np.array(sorted(self.months), dtype=np.int64)
+        sums = np.array([self.months[m][0] for m in months], dtype=np.float64)
+        counts = np.array([self.months[m][1] for m in months], dtype=np.int64)
+        return months, sums, counts
+
+    def monthly_series(self):
+        # Equivalent of resampling the daily series to month-end means (NaN for empty months)
+        months, sums, counts = self._month_frame()
+        start = np.datetime64(int(months[0]), 'M')
+        end = np.datetime64(int(months[-1]), 'M')
+        index = pd.date_range(start=pd.Timestamp(start), end=pd.Timestamp(end) + pd.offsets.MonthEnd(0), freq='M')
+        values = np.full(len(index), np.nan)
+        values[months - months[0]] = sums / counts
+        return pd.Series(values, index=index)
+
+    def summary(self):
+        if self.count == 0:
+            return None
+        months, sums, counts = self._month_frame()
+        years = months // 12 + 1970
+        calendar_months = months % 12 + 1
+
+        current_price = self.last_price
+        avg_price = self.mean
+        price_volatility = np.sqrt(self.m2 / (self.count - 1)) / avg_price * 100 if self.count > 1 else np.nan
+
+        last_year = years.max() - 1
+        in_last_year = years == last_year
+        if in_last_year.any():
+            last_year_avg_price = sums[in_last_year].sum() / counts[in_last_year].sum()
+        else:
+            last_year_avg_price = np.nan
+        yoy_change = ((current_price - last_year_avg_price) / last_year_avg_price) * 100
+
+        month_sums = np.bincount(calendar_months, weights=sums, minlength=13)[1:]
+        month_counts = np.bincount(calendar_months, weights=counts, minlength=13)[1:]
+        present = month_counts > 0
+        monthly_avg = pd.Series(month_sums[present] / month_counts[present],
+                                index=np.arange(1, 13)[present])
+
+        return {
+            'current_price': current_price,
+            'avg_price': avg_price,
+            'min_price': self.min,
+            'max_price': self.max,
+            'price_volatility': price_volatility,
+            'last_year_avg_price': last_year_avg_price,
+            'yoy_change': yoy_change,
+            'monthly_avg': monthly_avg,
+        }
@@ -0,0 +1,418 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from forecast_cache import file_fingerprint
+from price_stats import RunningPriceStats
+
+# Columnar copy of market_data/*.csv: one directory per crop holding memory-mapped NumPy
+# arrays sorted by (market, date), so a crop x market slice is a pair of offset lookups.
+# Each crop also keeps running summary statistics per market, updated as prices are appended.
+store_dir = os.environ.get("PRICE_STORE_DIR", "price_store")
+data_dir = "market_data"
+# Bumped when the stored layout changes; older versions are re-ingested from their CSV
+store_format = 2
+
+date_column = 'Reported Date'
+price_column = 'Modal Price (Rs./Quintal)'
+market_column = 'Market Name'
+date_formats = ["%d-%m-%Y", "%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y"]
+
+
+def crop_name_of(crop_file):
+    return os.path.basename(crop_file).replace('.csv', '')
+
+
+def detect_date_format(values, sample_size=200):
+    # Pick the format (Agmarknet's "01 Jan 2019" style or one of date_formats) that parses
+    # the most of a small sample of distinct values; None when none of them parses anything
+    sample = pd.Series(values).dropna().astype(str).unique()[:sample_size]
+    best_format, best_count = None, 0
+    for date_format in ["%d %b %Y"] + date_formats:
+        count = pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum()
+        if count > best_count:
+            best_format, best_count = date_format, count
+        if count == len(sample):
+            break
+    return best_format
+
+
+def parse_dates(values, label=""):
+    # Parse with the detected format, then retry only the rows it could not parse with the
+    # other formats
+    values = pd.Series(values)
+    date_format = detect_date_format(values)
+    if date_format is None:
+        return pd.to_datetime(values, errors='coerce')
+    dates = pd.to_datetime(values, format=date_format, errors='coerce')
+
+    # Check for date parsing issues
+    failed = dates.isna() & values.notna()
+    if failed.any():
+        print(f"Warning: Found {failed.sum()} dates in {label} not matching {date_format}. Trying alternative formats...")
+        for other_format in date_formats:
+            if other_format == date_format:
+                continue
+            dates[failed] = pd.to_datetime(values[failed], format=other_format, errors='coerce')
+            failed = dates.isna() & values.notna()
+            if not failed.any():
+                break
+    return dates
+
+
+class PricePartition:
+    def __init__(self, path, meta, stamp=None):
+        self.path = path
+        self.stamp = stamp
+        self.crop = meta['crop']
+        self.source_fingerprint = meta['source_fingerprint']
+        # Version of the data (changes on every ingest or append); used as the cache key
+        self.fingerprint = meta.get('version', self.source_fingerprint)
+        self.markets = meta['markets']
+        self.offsets = np.asarray(meta['offsets'], dtype=np.int64)
+        self.market_codes = {name: code for code, name in enumerate(self.markets)}
+        self.dates = np.load(os.path.join(path, "dates.npy"), mmap_mode='r')
+        self.prices = np.load(os.path.join(path, "prices.npy"), mmap_mode='r')
+        # Same rows with missing prices filled across markets, for the all-markets view
+        # (older stores without a CSV to re-ingest from only have the per-market fill)
+        all_prices_path = os.path.join(path, "all_prices.npy")
+        self.all_prices = np.load(all_prices_path, mmap_mode='r') if os.path.exists(all_prices_path) else self.prices
+        self.date_order = np.load(os.path.join(path, "date_order.npy"), mmap_mode='r')
+        self._stats = None
+
+    def __len__(self):
+        return len(self.prices)
+
+    def has_market(self, market):
+        # Rows with at least one known price
+        return self.stats(market) is not None
+
+    def market_slice(self, market):
+        # (dates, prices) views for one market, or None if the market has no rows
+        code = self.market_codes.get(market)
+        if code is None:
+            return None
+        start, end = self.offsets[code], self.offsets[code + 1]
+        if start == end:
+            return None
+        return self.dates[start:end], self.prices[start:end]
+
+    def series(self, market=None):
+        # Date-indexed price series for one market, or across all markets when market is None
+        if market is None:
+            order = np.asarray(self.date_order)
+            dates, prices = self.dates[order], self.all_prices[order]
+        else:
+            selected = self.market_slice(market)
+            if selected is None:
+                return None
+            dates, prices = selected
+        index = pd.DatetimeIndex(np.asarray(dates, dtype='datetime64[ns]'), name=date_column)
+        # Prices are stored as float32 but statistics are computed in double precision
+        return pd.Series(np.asarray(prices, dtype=np.float64), index=index, name=price_column)
+
+    def stats(self, market=None):
+        # Running statistics for one market (or all markets), or None if there is no data
+        if self._stats is None:
+            with open(os.path.join(self.path, "stats.json")) as f:
+                self._stats = json.load(f)
+        data = self._stats['all'] if market is None else self._stats['markets'].get(market)
+        if data is None or data['count'] == 0:
+            return None
+        return RunningPriceStats.from_dict(data)
+
+
+def _write_json(path, value):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+def _compute_stats(dates, prices, all_prices, codes, markets):
+    # Full scan, only done when a CSV is (re)ingested
+    all_stats = RunningPriceStats().update(dates, all_prices, tie_breaks=codes)
+    offsets = np.searchsorted(codes, np.arange(len(markets) + 1), side='left')
+    market_stats = {}
+    for code, market in enumerate(markets):
+        start, end = offsets[code], offsets[code + 1]
+        valid = ~np.isnan(prices[start:end])
+        market_stats[market] = RunningPriceStats().update(dates[start:end][valid], prices[start:end][valid]).to_dict()
+    return {'all': all_stats.to_dict(), 'markets': market_stats}
+
+
+def _write_version(crop_dir, meta, dates, prices, all_prices, date_order, stats):
+    # Versions are immutable directories; current.json is switched atomically to the new one
+    version_dir = os.path.join(crop_dir, meta['version'][:16])
+    if not os.path.exists(version_dir):
+        tmp_dir = tempfile.mkdtemp(dir=crop_dir, prefix=".ingest-")
+        np.save(os.path.join(tmp_dir, "dates.npy"), dates)
+        np.save(os.path.join(tmp_dir, "prices.npy"), prices)
+        np.save(os.path.join(tmp_dir, "all_prices.npy"), all_prices)
+        np.save(os.path.join(tmp_dir, "date_order.npy"), date_order)
+        _write_json(os.path.join(tmp_dir, "stats.json"), stats)
+        _write_json(os.path.join(tmp_dir, "meta.json"), meta)
+        try:
+            os.rename(tmp_dir, version_dir)
+        except OSError:
+            # Another process wrote the same version first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    _write_json(os.path.join(crop_dir, "current.json"), {'version': os.path.basename(version_dir)})
+
+    # Drop superseded versions; open memory maps stay valid after unlink
+    for entry in os.listdir(crop_dir):
+        entry_path = os.path.join(crop_dir, entry)
+        if os.path.isdir(entry_path) and entry_path != version_dir and not entry.startswith("."):
+            shutil.rmtree(entry_path, ignore_errors=True)
+    return version_dir
+
+
+class _CropLock:
+    # Serializes writers of one crop directory across threads and processes
+    def __init__(self, crop_dir):
+        os.makedirs(crop_dir, exist_ok=True)
+        self.path = os.path.join(crop_dir, ".lock")
+
+    def __enter__(self):
+        self.file = open(self.path, "w")
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+def ingest_crop(crop_file, source_dir=None, target_dir=None):
+    # Convert one crop CSV into the columnar store and return the written metadata
+    source_path = os.path.join(source_dir or data_dir, crop_file)
+    crop_dir = os.path.join(target_dir or store_dir, crop_name_of(crop_file))
+    crop_name = crop_name_of(crop_file)
+    fingerprint = file_fingerprint(source_path)
+
+    df = pd.read_csv(source_path, usecols=lambda c: c in (date_column, price_column, market_column))
+    if price_column not in df.columns:
+        raise ValueError(f"'{price_column}' column not found in {crop_name}")
+    if date_column not in df.columns:
+        raise ValueError(f"'{date_column}' column not found in {crop_name}")
+
+    df[date_column] = parse_dates(df[date_column], crop_name)
+    # Drop rows with invalid dates
+    df = df.dropna(subset=[date_column])
+
+    if market_column in df.columns:
+        markets = df[market_column].ffill().bfill().fillna("Unknown").astype(str)
+    else:
+        markets = pd.Series("Unknown", index=df.index)
+
+    # Missing prices are filled in file order within each market, so a market never takes
+    # another market's prices (a market without any price keeps NaN and has no statistics).
+    # The all-markets view keeps the file-order fill across markets, as the per-request
+    # pipeline used to.
+    raw_prices = pd.to_numeric(df[price_column], errors='coerce')
+    market_prices = raw_prices.groupby(markets.values).ffill().groupby(markets.values).bfill()
+    all_prices = raw_prices.ffill().bfill()
+
+    categories = pd.Categorical(markets)
+    codes = categories.codes.astype(np.int32)
+    dates = df[date_column].values.astype('datetime64[D]')
+    prices = market_prices.values.astype(np.float32)
+    all_prices = all_prices.values.astype(np.float32)
+
+    # Partition by market: rows sorted by (market, date), with CSR-style offsets per market
+    order = np.lexsort((dates, codes))
+    dates, prices, all_prices, codes = dates[order], prices[order], all_prices[order], codes[order]
+    market_names = [str(name) for name in categories.categories]
+    offsets = np.searchsorted(codes, np.arange(len(market_names) + 1), side='left')
+    # Stable permutation giving the all-markets view in date order
+    date_order = np.argsort(dates, kind='stable').astype(np.int64)
+
+    # The version also covers the layout, so a format bump writes a new version directory
+    # instead of finding the old one under the same name
+    meta = {
+        'crop': crop_name,
+        'source_fingerprint': fingerprint,
+        'version': hashlib.sha1(f"{fingerprint}:{store_format}".encode("utf-8")).hexdigest(),
+        'format': store_format,
+        'rows': int(len(prices)),
+        'markets': market_names,
+        'offsets': offsets.tolist(),
+    }
+    stats = _compute_stats(dates, prices, all_prices, codes, market_names)
+
+    with _CropLock(crop_dir):
+        _write_version(crop_dir, meta, dates, prices, all_prices, date_order, stats)
+
+    print(f"Ingested {crop_file}: {meta['rows']} rows across {len(meta['markets'])} markets")
+    return meta
+
+
+def append_prices(crop_file, rows, source_dir=None):
+    # Append new observations (dicts with 'market', 'date' and 'price') to a crop's series.
+    # The summary statistics are updated from the new rows only; the arrays are spliced
+    # without re-parsing. A later change of the crop's CSV re-ingests it and supersedes
+    # appended rows, since the export is then expected to contain them.
+    partition = load_partition(crop_file, source_dir)
+    crop_dir = os.path.dirname(partition.path)
+    crop_name = crop_name_of(crop_file)
+
+    new_df = pd.DataFrame(rows)
+    if new_df.empty:
+        return partition
+    for column in ('market', 'date', 'price'):
+        if column not in new_df.columns:
+            raise ValueError(f"Appended rows need a '{column}' field")
+    new_dates = parse_dates(new_df['date'].astype(str), crop_name)
+    new_prices = pd.to_numeric(new_df['price'], errors='coerce')
+    valid = new_dates.notna().values & new_prices.notna().values
+    if not valid.all():
+        raise ValueError("Appended rows need a valid date and a numeric price")
+    new_markets = new_df['market'].astype(str).values
+    new_dates = new_dates.values.astype('datetime64[D]')
+    new_prices = new_prices.values.astype(np.float32)
+
+    with _CropLock(crop_dir):
+        # Re-read under the lock so concurrent appends build on each other
+        version_dir, meta, stamp = _read_current(crop_dir)
+        partition = PricePartition(version_dir, meta, stamp)
+        # Market codes stay in name order, as ingest_crop assigns them, so new markets
+        # renumber the existing ones
+        markets = sorted(set(partition.markets) | set(new_markets))
+        market_codes = {market: code for code, market in enumerate(markets)}
+        recode = np.array([market_codes[market] for market in partition.markets], dtype=np.int64)
+        new_codes = np.array([market_codes[market] for market in new_markets], dtype=np.int64)
+
+        # Splice the new rows in after existing rows with the same (market, date)
+        old_counts = np.diff(partition.offsets)
+        old_codes = recode[np.repeat(np.arange(len(old_counts)), old_counts)]
+        old_order = np.argsort(old_codes, kind='stable')
+        old_codes = old_codes[old_order]
+        old_dates = np.asarray(partition.dates)[old_order]
+        old_keys = (old_codes << 32) + old_dates.astype(np.int64)
+        new_keys = (new_codes << 32) + new_dates.astype(np.int64)
+        batch_order = np.argsort(new_keys, kind='stable')
+        positions = np.searchsorted(old_keys, new_keys[batch_order], side='right')
+        dates = np.insert(old_dates, positions, new_dates[batch_order])
+        prices = np.insert(np.asarray(partition.prices)[old_order], positions, new_prices[batch_order])
+        all_prices = np.insert(np.asarray(partition.all_prices)[old_order], positions, new_prices[batch_order])
+        codes = np.insert(old_codes, positions, new_codes[batch_order])
+        offsets = np.searchsorted(codes, np.arange(len(markets) + 1), side='left')
+        date_order = np.argsort(dates, kind='stable').astype(np.int64)
+
+        with open(os.path.join(partition.path, "stats.json")) as f:
+            stats = json.load(f)
+        all_stats = RunningPriceStats.from_dict(stats['all'])
+        if all_stats.last_key is not None:
+            # The latest observation's tie-break is its market code
+            all_stats.last_key = (all_stats.last_key[0], int(recode[all_stats.last_key[1]]))
+        all_stats.update(new_dates[batch_order], new_prices[batch_order], tie_breaks=new_codes[batch_order])
+        stats['all'] = all_stats.to_dict()
+        for code in np.unique(new_codes):
+            market = markets[code]
+            selected = batch_order[new_codes[batch_order] == code]
+            existing = stats['markets'].get(market)
+            market_stats = RunningPriceStats.from_dict(existing) if existing else RunningPriceStats()
+            market_stats.update(new_dates[selected], new_prices[selected])
+            stats['markets'][market] = market_stats.to_dict()
+
+        digest = hashlib.sha1(partition.fingerprint.encode("utf-8"))
+        digest.update(new_keys.tobytes())
+        digest.update(new_prices.tobytes())
+        meta = {
+            'crop': partition.crop,
+            'source_fingerprint': partition.source_fingerprint,
+            'version': digest.hexdigest(),
+            'format': store_format,
+            'rows': int(len(prices)),
+            'markets': markets,
+            'offsets': offsets.tolist(),
+        }
+        _write_version(crop_dir, meta, dates, prices, all_prices, date_order, stats)
+
+    print(f"Appended {len(new_prices)} rows to {crop_file}")
+    return load_partition(crop_file, source_dir)
+
+
+def _read_current(crop_dir):
+    try:
+        current_path = os.path.join(crop_dir, "current.json")
+        stamp = os.stat(current_path).st_mtime_ns
+        with open(current_path) as f:
+            version_dir = os.path.join(crop_dir, json.load(f)['version'])
+        with open(os.path.join(version_dir, "meta.json")) as f:
+            return version_dir, json.load(f), stamp
+    except (FileNotFoundError, KeyError, ValueError):
+        return None, None, None
+
+
+def _current_stamp(crop_dir):
+    try:
+        return os.stat(os.path.join(crop_dir, "current.json")).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+_partitions = {}
+_partitions_lock = threading.Lock()
+
+
+def load_partition(crop_file, source_dir=None):
+    # Return the crop's partition, (re)ingesting the CSV when it changed since the last ingest
+    source_path = os.path.join(source_dir or data_dir, crop_file)
+    crop_dir = os.path.join(store_dir, crop_name_of(crop_file))
+    fingerprint = file_fingerprint(source_path) if os.path.exists(source_path) else None
+
+    def is_current(partition):
+        return (partition is not None
+                and (fingerprint is None or partition.source_fingerprint == fingerprint)
+                and partition.stamp == _current_stamp(crop_dir))
+
+    partition = _partitions.get(crop_file)
+    if is_current(partition):
+        return partition
+
+    with _partitions_lock:
+        partition = _partitions.get(crop_file)
+        if is_current(partition):
+            return partition
+        version_dir, meta, stamp = _read_current(crop_dir)
+        stale = meta is not None and fingerprint is not None and (
+            meta['source_fingerprint'] != fingerprint or meta.get('format') != store_format)
+        if meta is None or stale:
+            if fingerprint is None:
+                raise FileNotFoundError(source_path)
+            ingest_crop(crop_file, source_dir)
+            version_dir, meta, stamp = _read_current(crop_dir)
+        partition = PricePartition(version_dir, meta, stamp)
+        _partitions[crop_file] = partition
+        return partition
+
+
+def ingest_all(files=None):
+    if files is None:
+        files = sorted(f for f in os.listdir(data_dir) if f.endswith('.csv'))
+    for crop_file in files:
+        try:
+            ingest_crop(crop_file)
+        except Exception as e:
+            print(f"Error ingesting {crop_file}: {e}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert market_data CSVs into the columnar price store")
+    parser.add_argument("files", nargs="*", help="crop CSV file names (default: every CSV in the data directory)")
+    parser.add_argument("--data-dir", default=data_dir)
+    parser.add_argument("--store-dir", default=store_dir)
+    args = parser.parse_args()
+    data_dir = args.data_dir
+    store_dir = args.store_dir
+    ingest_all(args.files or None)
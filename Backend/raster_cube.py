@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+
+import numpy as np
+from affine import Affine
+from pyproj import CRS
+from rasterio.enums import Resampling
+from rasterio.transform import array_bounds, rowcol
+from rasterio.warp import reproject, transform_bounds
+
+from raster_layers import band_values, file_stamp, get_transformer, registry
+
+# All GIS layers reprojected onto one common grid and stored as a single memory-mapped
+# cube (layers x rows x cols) of raw band values, so a point query is one row/col
+# computation and one strided read. Values are converted back to each band's dtype and
+# rescaled at query time, exactly as the per-layer path does.
+# Build with: python raster_cube.py --folder gis_data
+cube_dir = os.environ.get("RASTER_CUBE_DIR", os.path.join("cache", "raster_cube"))
+
+
+def build_cube(folder, out_dir=None, default_crs="EPSG:32643", resolution=None):
+    out_dir = out_dir or cube_dir
+    paths = registry.paths(folder)
+    if not paths:
+        raise ValueError(f"No rasters found in {folder}")
+    layers = [registry.get(path, default_crs) for path in paths]
+
+    # Common grid: the most used CRS, the finest resolution in it and the union of all
+    # extents, snapped to the grid of the finest layer in that CRS so layers already on that
+    # grid are copied pixel for pixel
+    crs = CRS.from_wkt(Counter(layer.crs.to_wkt() for layer in layers).most_common(1)[0][0])
+    reference = min((layer for layer in layers if CRS.from_wkt(layer.crs.to_wkt()) == crs),
+                    key=lambda layer: abs(layer.transform.a))
+    if resolution is None:
+        resolution = abs(reference.transform.a)
+    bounds = [transform_bounds(layer.crs, crs, *array_bounds(layer.dataset.height, layer.dataset.width,
+                                                            layer.transform))
+              for layer in layers]
+    left = min(b[0] for b in bounds)
+    bottom = min(b[1] for b in bounds)
+    right = max(b[2] for b in bounds)
+    top = max(b[3] for b in bounds)
+    # Rounded before floor/ceil so float noise never adds a cell
+    origin_x, origin_y = reference.transform.c, reference.transform.f
+    left = origin_x + np.floor(round((left - origin_x) / resolution, 6)) * resolution
+    top = origin_y + np.ceil(round((top - origin_y) / resolution, 6)) * resolution
+    width = int(np.ceil((right - left) / resolution))
+    height = int(np.ceil((top - bottom) / resolution))
+    transform = Affine(resolution, 0, left, 0, -resolution, top)
+    # Floating point type holding every band's values exactly (float64 for 32-bit integers)
+    dtype = np.result_type(np.float32, *[layer.dtype for layer in layers])
+    size_mb = len(layers) * height * width * dtype.itemsize / 2 ** 20
+    print(f"Building {len(layers)} x {height} x {width} {dtype} cube ({size_mb:.0f} MB)")
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_dir)), exist_ok=True)
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(out_dir)), prefix=".cube_")
+    os.chmod(work_dir, 0o755)
+    try:
+        cube = np.lib.format.open_memmap(os.path.join(work_dir, "cube.npy"), mode="w+",
+                                         dtype=dtype, shape=(len(layers), height, width))
+        for i, layer in enumerate(layers):
+            print(f"Reprojecting {layer.path} -> {layer.name}")
+            band = np.full((height, width), np.nan, dtype=dtype)
+            with layer.lock:
+                source = layer.dataset.read(1).astype(dtype)
+            # Nearest neighbour keeps source values exact where the grids line up. Nodata
+            # pixels are copied like any value, as the per-layer path reads them; only cells
+            # outside the layer stay NaN
+            reproject(source=source, destination=band, src_transform=layer.transform, src_crs=layer.crs,
+                      src_nodata=None, dst_transform=transform, dst_crs=crs, dst_nodata=np.nan,
+                      resampling=Resampling.nearest)
+            cube[i] = band
+        cube.flush()
+        del cube
+
+        meta = {
+            'names': [layer.name for layer in layers],
+            'dtypes': [str(np.dtype(layer.dtype)) for layer in layers],
+            'stats': [layer.stats() if layer.rescale else None for layer in layers],
+            'crs': crs.to_wkt(),
+            'transform': list(transform)[:6],
+            'shape': [len(layers), height, width],
+            'sources': {os.path.abspath(layer.path): layer.stamp for layer in layers},
+        }
+        with open(os.path.join(work_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        # Replace the previous cube only once the new one is complete
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.replace(work_dir, out_dir)
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    return out_dir
+
+
+class RasterCube:
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if 'dtypes' not in meta:
+            raise ValueError(f"Raster cube at {path} predates raw band storage; rebuild it")
+        self.names = meta['names']
+        self.dtypes = meta['dtypes']
+        self.stats = meta['stats']
+        self.crs = CRS.from_wkt(meta['crs'])
+        self.transform = Affine(*meta['transform'])
+        self.sources = meta['sources']
+        self.cube = np.load(os.path.join(path, "cube.npy"), mmap_mode="r")
+
+    def is_current(self, raster_paths):
+        # Built from exactly these rasters, none of which changed since
+        paths = {os.path.abspath(path) for path in raster_paths}
+        if paths != set(self.sources):
+            return False
+        try:
+            return all(file_stamp(path) == self.sources[path] for path in paths)
+        except FileNotFoundError:
+            return False
+
+    def pixels(self, lats, lons):
+        # Cube rows/cols of the points and a mask of those inside the cube
+        x, y = get_transformer(self.crs).transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        rows, cols = rowcol(self.transform, np.atleast_1d(x), np.atleast_1d(y))
+        rows, cols = np.asarray(rows), np.asarray(cols)
+        inside = (rows >= 0) & (rows < self.cube.shape[1]) & (cols >= 0) & (cols < self.cube.shape[2])
+        return rows, cols, inside
+
+    def values_at(self, lat, lon):
+        # Same {layer name: value} as get_raster_values; NaN where a layer has no data
+        rows, cols, inside = self.pixels([lat], [lon])
+        if not inside[0]:
+            raise IndexError(f"Point ({lat}, {lon}) is outside the raster cube")
+        raw = self.cube[:, rows[0], cols[0]]
+        results = {}
+        for name, value, dtype, stats in zip(self.names, raw, self.dtypes, self.stats):
+            if np.isnan(value):
+                results[name] = float('nan')
+            else:
+                # Same dtype and rounding as get_raster_values
+                results[name] = float(round(band_values(value, dtype, stats), 2))
+        return results
+
+    def values_at_many(self, lats, lons):
+        # {layer name: array of values}, NaN for points outside the cube; pixels are read in
+        # row-major order for locality
+        rows, cols, inside = self.pixels(lats, lons)
+        points = np.flatnonzero(inside)
+        points = points[np.lexsort((cols[points], rows[points]))]
+        raw = self.cube[:, rows[points], cols[points]]
+        results = {}
+        for name, layer_raw, dtype, stats in zip(self.names, raw, self.dtypes, self.stats):
+            covered = ~np.isnan(layer_raw)
+            layer_values = band_values(layer_raw[covered], dtype, stats)
+            values = np.full(len(rows), np.nan, dtype=np.result_type(layer_values.dtype, np.float32))
+            values[points[covered]] = layer_values
+            results[name] = values
+        return results
+
+
+_cube = {'stamp': None, 'cube': None}
+_cube_lock = threading.Lock()
+
+
+def current_cube(raster_paths, path=None):
+    # The cube at `path` when it exists and matches raster_paths, else None
+    path = path or cube_dir
+    try:
+        stamp = os.stat(os.path.join(path, "meta.json")).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _cube_lock:
+        if _cube['stamp'] != (path, stamp):
+            try:
+                _cube['cube'] = RasterCube(path)
+            except ValueError as e:
+                print(e)
+                _cube['cube'] = None
+            _cube['stamp'] = (path, stamp)
+        cube = _cube['cube']
+    return cube if cube is not None and cube.is_current(raster_paths) else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Align all GIS rasters into one memory-mapped cube")
+    parser.add_argument("--folder", default="gis_data")
+    parser.add_argument("--out", default=cube_dir)
+    parser.add_argument("--default-crs", default="EPSG:32643", help="CRS of rasters without one")
+    parser.add_argument("--resolution", type=float, help="cell size in CRS units (default: finest layer)")
+    args = parser.parse_args()
+    print(f"Cube written to {build_cube(args.folder, args.out, args.default_crs, args.resolution)}")
@@ -0,0 +1,268 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+import rasterio
+from pyproj import CRS, Transformer
+from rasterio.transform import rowcol
+from rasterio.windows import Window
+
+# GIS raster access: a process-wide pool of open rasters, and per-band statistics
+# (min/max/mean/std) computed once per file version and kept in sidecar JSON files, so
+# requests never decode a whole band
+stats_cache_dir = os.environ.get("RASTER_STATS_DIR", os.path.join("cache", "raster_stats"))
+
+# Raster file name -> (layer name, rescale to 0-100 with the band's min/max)
+exact_layers = {
+    'meanticd': ("inorganic_carbon_density", False),
+    'meantocd': ("organic_carbon_density", False),
+    'fsalt': ("salt_affected", True),
+    'fwatero': ("water_erosion", True),
+    'fwindero': ("wind_erosion", True),
+    'fwaterlog': ("water_logging", True),
+}
+
+# File name prefix -> (layer name, rescale), checked in order after the exact names
+prefix_layers = [
+    ('ffallow', "fallow", True),
+    ('fkharif', "kharif", True),
+    ('frabi', "rabi", True),
+    ('fnsa', "net_sown_area", True),
+    ('rootsm', "root_level_surface_moisture", False),
+    ('s_runoff', "surface_runoff", False),
+    ('upSMNRSC', "upper_level_surface_moisture", False),
+    ('ocm2_vf', "vegetation_fraction", False),
+    ('ocm2_ndvi_filt', "filtered_ndvi", False),
+    ('localocm2', "local_ndvi", False),
+    ('globalocm2', "global_ndvi", False),
+    ('evaNHP', "evapotranspiration", False),
+]
+
+
+def layer_name(raster_path):
+    # Returns (layer name, rescale); unknown files keep their own name, unscaled
+    file_name = os.path.splitext(os.path.basename(raster_path))[0]
+    if file_name in exact_layers:
+        return exact_layers[file_name]
+    for prefix, name, rescale in prefix_layers:
+        if file_name.startswith(prefix):
+            return name, rescale
+    return file_name, False
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _stats_path(path):
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    return os.path.join(stats_cache_dir, f"{digest}.json")
+
+
+def compute_band_stats(dataset, band=1):
+    # Block by block, so memory stays at one block however large the raster is
+    count = 0
+    total = 0.0
+    total_sq = 0.0
+    band_min = np.inf
+    band_max = -np.inf
+    for _, window in dataset.block_windows(band):
+        block = dataset.read(band, window=window).astype(np.float64)
+        count += block.size
+        total += block.sum()
+        total_sq += np.square(block).sum()
+        band_min = min(band_min, block.min())
+        band_max = max(band_max, block.max())
+    mean = total / count
+    return {
+        'min': float(band_min),
+        'max': float(band_max),
+        'mean': float(mean),
+        'std': float(np.sqrt(max(total_sq / count - mean ** 2, 0.0))),
+    }
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def band_stats(dataset, path, band=1):
+    # Stats of one band, recomputed only when the raster file changes
+    stamp = file_stamp(path)
+    key = (os.path.abspath(path), band)
+    with _stats_lock:
+        cached = _stats.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    sidecar = _stats_path(path)
+    stats = None
+    try:
+        with open(sidecar) as f:
+            saved = json.load(f)
+        if saved['stamp'] == stamp and str(band) in saved['bands']:
+            stats = saved['bands'][str(band)]
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+
+    if stats is None:
+        print(f"Computing band statistics for {path}")
+        stats = compute_band_stats(dataset, band)
+        os.makedirs(stats_cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=stats_cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({'path': os.path.abspath(path), 'stamp': stamp, 'bands': {str(band): stats}}, f)
+        os.replace(tmp_path, sidecar)
+
+    with _stats_lock:
+        _stats[key] = (stamp, stats)
+    return stats
+
+
+def read_pixel(dataset, row, col, band=1):
+    # One-pixel window read; only the block(s) holding the pixel are decoded
+    if not (0 <= row < dataset.height and 0 <= col < dataset.width):
+        raise IndexError(f"Point (row {row}, col {col}) is outside {dataset.name}")
+    return dataset.read(band, window=Window(col, row, 1, 1))[0, 0]
+
+
+def rescale(value, stats, dtype):
+    # (value - min) / (max - min) * 100 in the band's own dtype, as when min/max came from the band
+    band_min = np.dtype(dtype).type(stats['min'])
+    band_max = np.dtype(dtype).type(stats['max'])
+    return (value - band_min) / (band_max - band_min) * 100
+
+
+def band_values(raw, dtype, stats=None):
+    # Raw values as read from the band, in its dtype, rescaled to 0-100 when stats are given
+    value = np.asarray(raw).astype(dtype) if np.ndim(raw) else np.dtype(dtype).type(raw)
+    return value if stats is None else rescale(value, stats, dtype)
+
+
+_transformers = threading.local()
+
+
+def get_transformer(crs):
+    # One WGS84 -> crs transformer per CRS and thread (pyproj transformers are not thread-safe)
+    cache = getattr(_transformers, 'cache', None)
+    if cache is None:
+        cache = _transformers.cache = {}
+    key = crs.to_wkt()
+    transformer = cache.get(key)
+    if transformer is None:
+        transformer = cache[key] = Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+    return transformer
+
+
+class RasterLayer:
+    # An open raster with its metadata; reads go through a lock since GDAL handles must not
+    # be used from several threads at once
+
+    def __init__(self, path, default_crs):
+        self.path = path
+        self.stamp = file_stamp(path)
+        self.dataset = rasterio.open(path)
+        self.lock = threading.Lock()
+        self.crs = self.dataset.crs if self.dataset.crs else CRS.from_string(default_crs)
+        self.transform = self.dataset.transform
+        self.dtype = self.dataset.dtypes[0]
+        self.name, self.rescale = layer_name(path)
+
+    def stats(self):
+        with self.lock:
+            return band_stats(self.dataset, self.path)
+
+    def value_at(self, lat, lon):
+        x, y = get_transformer(self.crs).transform(lon, lat)
+        row, col = rowcol(self.transform, x, y)
+        with self.lock:
+            value = read_pixel(self.dataset, row, col)
+        if self.rescale:
+            value = rescale(value, self.stats(), self.dtype)
+        return value
+
+    def values_at_many(self, lats, lons):
+        # Vectorized sampling: one transform call for all points, then each raster block
+        # holding any point is read once, in block order; NaN for points outside the raster
+        x, y = get_transformer(self.crs).transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        rows, cols = rowcol(self.transform, np.atleast_1d(x), np.atleast_1d(y))
+        rows, cols = np.asarray(rows), np.asarray(cols)
+        # Kept in the precision value_at returns (at least float32 for NaN; float64 for
+        # rescaled integer bands), so rounding matches it
+        stats = self.stats() if self.rescale else None
+        value_dtype = band_values(np.zeros(0, self.dtype), self.dtype, stats).dtype
+        values = np.full(len(rows), np.nan, dtype=np.result_type(value_dtype, np.float32))
+        inside = np.nonzero((rows >= 0) & (rows < self.dataset.height) & (cols >= 0) & (cols < self.dataset.width))[0]
+        if len(inside) == 0:
+            return values
+
+        block_height, block_width = self.dataset.block_shapes[0]
+        block_rows = rows[inside] // block_height
+        block_cols = cols[inside] // block_width
+        order = np.lexsort((block_cols, block_rows))
+        inside, block_rows, block_cols = inside[order], block_rows[order], block_cols[order]
+        starts = np.flatnonzero(np.r_[True, (np.diff(block_rows) != 0) | (np.diff(block_cols) != 0)])
+        ends = np.r_[starts[1:], len(inside)]
+
+        raw = np.empty(len(inside), dtype=self.dtype)
+        with self.lock:
+            for start, end in zip(starts, ends):
+                row_off = int(block_rows[start] * block_height)
+                col_off = int(block_cols[start] * block_width)
+                window = Window(col_off, row_off,
+                                min(block_width, self.dataset.width - col_off),
+                                min(block_height, self.dataset.height - row_off))
+                block = self.dataset.read(1, window=window)
+                points = inside[start:end]
+                raw[start:end] = block[rows[points] - row_off, cols[points] - col_off]
+        values[inside] = band_values(raw, self.dtype, stats)
+        return values
+
+    def close(self):
+        with self.lock:
+            self.dataset.close()
+
+
+class RasterRegistry:
+    # Process-wide pool of open rasters: each file is opened once and reopened when it
+    # changes, and folder listings are re-globbed only when the folder's contents change
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._layers = {}
+        self._listings = {}
+
+    def paths(self, folder, patterns=("*.asc", "*.tif")):
+        stamp = os.stat(folder).st_mtime_ns
+        with self._lock:
+            cached = self._listings.get(folder)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+        paths = []
+        for pattern in patterns:
+            paths += glob.glob(os.path.join(folder, pattern))
+        with self._lock:
+            self._listings[folder] = (stamp, paths)
+            # Close rasters that disappeared from the folder
+            for path in [p for p in self._layers if os.path.dirname(p) == folder and p not in paths]:
+                self._layers.pop(path).close()
+        return paths
+
+    def get(self, path, default_crs="EPSG:32643"):
+        stamp = file_stamp(path)
+        with self._lock:
+            layer = self._layers.get(path)
+            if layer is not None and layer.stamp == stamp:
+                return layer
+            if layer is not None:
+                layer.close()
+            layer = self._layers[path] = RasterLayer(path, default_crs)
+            return layer
+
+
+registry = RasterRegistry()
@@ -0,0 +1,123 @@
+import gzip
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses fall back to gzip
+    brotli = None
+
+# Number of rendered responses kept in memory
+cache_size = int(os.environ.get("RESPONSE_CACHE_SIZE", 256))
+
+# Bodies smaller than this are sent uncompressed
+min_compress_bytes = 1024
+
+
+class SingleFlight:
+    # Runs one computation per key at a time; concurrent callers with the same key wait for
+    # the running computation and share its result (or its exception)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+
+class ResponseCache:
+    # LRU of serialized response bodies, with their compressed variants built on first use
+
+    def __init__(self, max_entries=cache_size):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flight = SingleFlight()
+
+    def get_or_compute(self, key, compute):
+        # compute() returns the body bytes; it runs once per key even under concurrent misses
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        def fill():
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                entry = {'body': compute(), 'encoded': {}}
+                with self._lock:
+                    self._entries[key] = entry
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return entry
+
+        return self._flight.do(key, fill)
+
+    def encoded(self, entry, encoding):
+        body = entry['encoded'].get(encoding)
+        if body is None:
+            if encoding == 'br':
+                body = brotli.compress(entry['body'], quality=5)
+            else:
+                body = gzip.compress(entry['body'], compresslevel=6)
+            entry['encoded'][encoding] = body
+        return body
+
+
+def choose_encoding(request, size):
+    if size < min_compress_bytes:
+        return None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def cached_response(cache, request, key, compute, last_modified=None, mimetype='application/json'):
+    # Serve the body cached under `key`, computing it at most once, with ETag/Last-Modified
+    # validators (304 when the client's copy is current) and gzip/brotli content encoding
+    entry = cache.get_or_compute(key, compute)
+    encoding = choose_encoding(request, len(entry['body']))
+    if encoding is None:
+        response = Response(entry['body'], mimetype=mimetype)
+        response.set_etag(key)
+    else:
+        response = Response(cache.encoded(entry, encoding), mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+        # Each representation needs its own strong validator
+        response.set_etag(f"{key}-{encoding}")
+    response.vary.add('Accept-Encoding')
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
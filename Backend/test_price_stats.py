@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from price_stats import RunningPriceStats
+
+
+def sample(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = np.datetime64('2021-01-01') + np.sort(rng.integers(0, 900, n)).astype('timedelta64[D]')
+    prices = rng.uniform(1500, 2500, n).round()
+    tie_breaks = rng.integers(0, 3, n)
+    return dates, prices, tie_breaks
+
+
+def test_batches_match_one_update():
+    dates, prices, tie_breaks = sample()
+    whole = RunningPriceStats().update(dates, prices, tie_breaks=tie_breaks)
+    batched = RunningPriceStats()
+    for start, end in [(0, 1), (1, 50), (50, 51), (51, 200)]:
+        # Round trip through the stored form, as append_prices does between batches
+        batched = RunningPriceStats.from_dict(batched.to_dict())
+        batched.update(dates[start:end], prices[start:end], tie_breaks=tie_breaks[start:end])
+
+    assert batched.count == whole.count
+    assert batched.mean == pytest.approx(whole.mean, rel=1e-12)
+    assert batched.m2 == pytest.approx(whole.m2, rel=1e-9)
+    assert (batched.min, batched.max) == (whole.min, whole.max)
+    assert batched.last_key == whole.last_key
+    assert batched.last_price == whole.last_price
+    assert batched.months == pytest.approx(whole.months)
+
+
+def test_summary_matches_pandas():
+    dates, prices, _ = sample()
+    stats = RunningPriceStats().update(dates, prices)
+    series = pd.Series(prices, index=pd.DatetimeIndex(dates))
+    summary = stats.summary()
+
+    assert summary['current_price'] == prices[-1]
+    assert summary['avg_price'] == pytest.approx(series.mean())
+    assert summary['price_volatility'] == pytest.approx(series.std() / series.mean() * 100)
+    last_year = series.index.year.max() - 1
+    assert summary['last_year_avg_price'] == pytest.approx(series[series.index.year == last_year].mean())
+    pd.testing.assert_series_equal(summary['monthly_avg'], series.groupby(series.index.month).mean(),
+                                   check_index_type=False, check_names=False)
+    monthly = stats.monthly_series()
+    expected = series.resample('M').mean()
+    np.testing.assert_allclose(monthly.values, expected.values)
+    assert (monthly.index == expected.index).all()
+
+
+def test_latest_price_tie_breaks():
+    day = np.datetime64('2023-05-01')
+    stats = RunningPriceStats().update([day, day], [10.0, 20.0], tie_breaks=[1, 0])
+    # Higher tie-break wins on the same day
+    assert stats.last_price == 10.0
+    # A later batch with an equal key replaces it, like the later row of a stable sort
+    stats.update([day], [30.0], tie_breaks=[1])
+    assert stats.last_price == 30.0
+    # An earlier day never does
+    stats.update([day - 1], [40.0], tie_breaks=[5])
+    assert stats.last_price == 30.0
+    assert stats.count == 4
@@ -0,0 +1,114 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import price_store
+
+fixture_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data")
+crop_file = "Onion.csv"
+
+# Appended after the fixture: rows on a date a market already has (the last one and one
+# in the middle), two rows for one (market, date) in the same batch, and a new market whose
+# name sorts first, on the same new latest date as an existing market
+appended = [
+    {'market': "Nagpur", 'date': "18-12-2023", 'price': 2010},
+    {'market': "Hingna", 'date': "16-05-2022", 'price': 1750},
+    {'market': "Tumsar", 'date': "25-12-2023", 'price': 2300},
+    {'market': "Amravati", 'date': "25-12-2023", 'price': 2500},
+    {'market': "Tumsar", 'date': "25-12-2023", 'price': 2280},
+    {'market': "Amravati", 'date': "01-01-2024", 'price': 2450},
+]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    data_dir = tmp_path / "market_data"
+    data_dir.mkdir()
+    shutil.copy(os.path.join(fixture_dir, crop_file), data_dir / crop_file)
+    monkeypatch.setattr(price_store, "store_dir", str(tmp_path / "price_store"))
+    monkeypatch.setattr(price_store, "_partitions", {})
+    return data_dir
+
+
+def rescan(tmp_path, monkeypatch, rows):
+    # Partition ingested from scratch from the fixture CSV with the rows added at its end
+    data_dir = tmp_path / "rescan_data"
+    data_dir.mkdir()
+    df = pd.read_csv(os.path.join(fixture_dir, crop_file), dtype=str, keep_default_na=False)
+    extra = pd.DataFrame({
+        price_store.date_column: [row['date'] for row in rows],
+        price_store.price_column: [str(row['price']) for row in rows],
+        price_store.market_column: [row['market'] for row in rows],
+    })
+    pd.concat([df, extra]).to_csv(data_dir / crop_file, index=False)
+    monkeypatch.setattr(price_store, "store_dir", str(tmp_path / "rescan_store"))
+    monkeypatch.setattr(price_store, "_partitions", {})
+    return price_store.load_partition(crop_file, str(data_dir))
+
+
+def assert_same_stats(actual, expected):
+    assert actual.count == expected.count
+    assert actual.min == expected.min
+    assert actual.max == expected.max
+    assert actual.last_key == expected.last_key
+    assert actual.last_price == expected.last_price
+    assert actual.mean == pytest.approx(expected.mean, rel=1e-12)
+    assert actual.m2 == pytest.approx(expected.m2, rel=1e-9)
+    assert sorted(actual.months) == sorted(expected.months)
+    for month, (total, count) in expected.months.items():
+        assert actual.months[month][0] == pytest.approx(total, rel=1e-12)
+        assert actual.months[month][1] == count
+
+
+def test_append_matches_full_rescan(store, tmp_path, monkeypatch):
+    price_store.load_partition(crop_file, str(store))
+    appended_partition = price_store.append_prices(crop_file, appended, str(store))
+    expected = rescan(tmp_path, monkeypatch, appended)
+
+    assert appended_partition.markets == expected.markets
+    np.testing.assert_array_equal(appended_partition.offsets, expected.offsets)
+    np.testing.assert_array_equal(appended_partition.dates, expected.dates)
+    np.testing.assert_array_equal(appended_partition.prices, expected.prices)
+    np.testing.assert_array_equal(appended_partition.all_prices, expected.all_prices)
+    np.testing.assert_array_equal(appended_partition.date_order, expected.date_order)
+    for market in [None] + expected.markets:
+        assert_same_stats(appended_partition.stats(market), expected.stats(market))
+        pd.testing.assert_series_equal(appended_partition.series(market), expected.series(market))
+
+
+def test_append_in_batches_matches_one_append(store, tmp_path, monkeypatch):
+    price_store.load_partition(crop_file, str(store))
+    for row in appended:
+        partition = price_store.append_prices(crop_file, [row], str(store))
+    expected = rescan(tmp_path, monkeypatch, appended)
+
+    assert partition.markets == expected.markets
+    np.testing.assert_array_equal(partition.prices, expected.prices)
+    for market in [None] + expected.markets:
+        assert_same_stats(partition.stats(market), expected.stats(market))
+
+
+def test_append_updates_latest_price(store):
+    price_store.load_partition(crop_file, str(store))
+    partition = price_store.append_prices(crop_file, appended, str(store))
+
+    # Same (market, date) rows: the one appended last is the latest observation
+    assert partition.stats("Tumsar").summary()['current_price'] == 2280
+    assert partition.stats("Nagpur").summary()['current_price'] == 2010
+    assert partition.stats("Amravati").summary()['current_price'] == 2450
+    assert partition.stats().summary()['current_price'] == 2450
+    assert partition.has_market("Amravati")
+
+
+def test_append_rejects_invalid_rows(store):
+    price_store.load_partition(crop_file, str(store))
+    with pytest.raises(ValueError):
+        price_store.append_prices(crop_file, [{'market': "Nagpur", 'date': "18-12-2023"}], str(store))
+    with pytest.raises(ValueError):
+        price_store.append_prices(crop_file, [{'market': "Nagpur", 'date': "not a date", 'price': 1}], str(store))
+    with pytest.raises(ValueError):
+        price_store.append_prices(crop_file, [{'market': "Nagpur", 'date': "18-12-2023", 'price': "n/a"}],
+                                  str(store))
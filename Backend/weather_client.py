@@ -0,0 +1,132 @@
+import datetime
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Open-Meteo archive client: one keep-alive session shared by a small thread pool, a
+# global request rate limit and retries with exponential backoff
+weather_base_url = os.environ.get("WEATHER_API_URL", "https://archive-api.open-meteo.com/v1/archive")
+weather_concurrency = int(os.environ.get("WEATHER_CONCURRENCY", 4))
+# Requests started per second across all threads (0 disables the limit)
+weather_rate_limit = float(os.environ.get("WEATHER_RATE_LIMIT", 5))
+weather_retries = int(os.environ.get("WEATHER_RETRIES", 3))
+weather_backoff = float(os.environ.get("WEATHER_BACKOFF", 0.5))
+weather_timeout = float(os.environ.get("WEATHER_TIMEOUT", 30))
+# Years of data per request; a larger value collapses the range into fewer requests
+weather_chunk_years = int(os.environ.get("WEATHER_CHUNK_YEARS", 1))
+
+daily_variables = "temperature_2m_max,temperature_2m_min,precipitation_sum,relative_humidity_2m_mean"
+
+_session = None
+_executor = None
+_setup_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _setup_lock:
+        if _session is None:
+            retry = Retry(total=weather_retries, backoff_factor=weather_backoff,
+                          status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",),
+                          respect_retry_after_header=True, raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=weather_concurrency, max_retries=retry)
+            _session = requests.Session()
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def get_executor():
+    global _executor
+    with _setup_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=weather_concurrency, thread_name_prefix="weather")
+        return _executor
+
+
+class RateLimiter:
+    # Spaces request starts at least `interval` seconds apart across threads
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def wait(self, interval):
+        if interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + interval
+        if start > now:
+            time.sleep(start - now)
+
+
+_rate_limiter = RateLimiter()
+
+
+def date_ranges(start, end, chunk_years=None):
+    # Split [start, end] into consecutive, non-overlapping ranges running from a date to the
+    # same date chunk_years later (inclusive, so N years plus the end day take N requests)
+    chunk_years = chunk_years or weather_chunk_years
+    ranges = []
+    chunk_start = start
+    while chunk_start <= end:
+        try:
+            chunk_end = chunk_start.replace(year=chunk_start.year + chunk_years)
+        except ValueError:  # Feb 29
+            chunk_end = chunk_start.replace(year=chunk_start.year + chunk_years, day=28)
+        chunk_end = min(chunk_end, end)
+        ranges.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + datetime.timedelta(days=1)
+    return ranges
+
+
+def fetch_daily(lat, lon, start_date, end_date, min_interval=0):
+    # Daily data for one date range as the API's "daily" dict, or None on failure
+    interval = max(min_interval, 1 / weather_rate_limit if weather_rate_limit > 0 else 0)
+    _rate_limiter.wait(interval)
+    params = {
+        'latitude': lat,
+        'longitude': lon,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'daily': daily_variables,
+        'timezone': 'auto',
+    }
+    try:
+        response = get_session().get(weather_base_url, params=params, timeout=weather_timeout)
+    except requests.RequestException as e:
+        print(f"Error fetching data for {start_date} to {end_date}: {e}")
+        return None
+
+    if response.status_code != 200:
+        print(f"Error fetching data for {start_date} to {end_date}: {response.status_code}")
+        print(f"Error message: {response.text}")
+        return None
+
+    data = response.json()
+    daily = data.get("daily", {})
+    if not all(key in daily for key in ("time", "temperature_2m_max", "temperature_2m_min", "precipitation_sum")):
+        print(f"Missing required data fields for {start_date} to {end_date}")
+        print(f"Available fields: {daily.keys()}")
+        return None
+    return daily
+
+
+def fetch_ranges(lat, lon, spans, min_interval=0):
+    # Fetch several [start, end] spans as concurrent chunk requests; returns the daily dicts
+    # in span order
+    ranges = [chunk for start, end in spans for chunk in date_ranges(start, end)]
+    futures = [get_executor().submit(fetch_daily, lat, lon, chunk_start, chunk_end, min_interval)
+               for chunk_start, chunk_end in ranges]
+    return [future.result() for future in futures]
+
+
+def fetch_range(lat, lon, start, end, min_interval=0):
+    return fetch_ranges(lat, lon, [(start, end)], min_interval)
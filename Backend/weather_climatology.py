@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# Day-of-year climatology for daily weather columns: level + linear trend + annual
+# harmonics fitted by least squares over the fetched history, with the recent anomaly
+# decaying into the forecast. A NumPy-only alternative to the LSTM forecasters.
+
+harmonics = 3
+# Days averaged for the recent anomaly, and its e-folding time in the forecast
+anomaly_days = 14
+anomaly_decay_days = 7
+# Physical bounds per column; predictions are clipped to them
+bounds = {
+    'Rainfall': (0, None),
+    'Humidity': (0, 100),
+}
+
+
+def _features(days, day_of_year):
+    # days: time in years relative to the last observation; day_of_year: 1-366
+    columns = [np.ones_like(days), days]
+    for k in range(1, harmonics + 1):
+        angle = 2 * np.pi * k * day_of_year / 365.25
+        columns.append(np.sin(angle))
+        columns.append(np.cos(angle))
+    return np.stack(columns, axis=-1)
+
+
+def forecast_climatology(df, forecast_periods=180):
+    # Same output as forecast_lstm: a DataFrame over the same future dates with one column
+    # per input column, and the fitted coefficients per column
+    forecast_start_date = df.index[-1] + pd.Timedelta(days=1)
+    future_dates = pd.date_range(start=forecast_start_date + pd.Timedelta(days=1),
+                                 periods=forecast_periods)
+    forecast_df = pd.DataFrame(index=future_dates)
+
+    elapsed = ((df.index - df.index[-1]).days.values / 365.25).astype(float)
+    X = _features(elapsed, df.index.dayofyear.values.astype(float))
+    future_elapsed = ((future_dates - df.index[-1]).days.values / 365.25).astype(float)
+    future_X = _features(future_elapsed, future_dates.dayofyear.values.astype(float))
+    lead_days = (future_dates - df.index[-1]).days.values
+
+    models = {}
+    for column in df.columns:
+        values = df[column].values.astype(float)
+        observed = ~np.isnan(values)
+        if observed.sum() < X.shape[1]:
+            forecast_df[column] = np.nan
+            continue
+        beta = np.linalg.lstsq(X[observed], values[observed], rcond=None)[0]
+        residuals = values - X @ beta
+        recent = residuals[-anomaly_days:]
+        anomaly = np.nanmean(recent) if (~np.isnan(recent)).any() else 0.0
+
+        predictions = future_X @ beta + anomaly * np.exp(-lead_days / anomaly_decay_days)
+        if column in bounds:
+            predictions = np.clip(predictions, *bounds[column])
+        forecast_df[column] = predictions
+        models[column] = beta
+    return forecast_df, models
@@ -0,0 +1,157 @@
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from response_cache import SingleFlight
+
+# Trained weather models kept on disk per region (weather grid cell) and training window,
+# so requests reuse a model instead of training one: a cached model is fine-tuned for a few
+# epochs when newer data arrives and retrained from scratch once it is too old. The least
+# recently used models are deleted when the directory grows past its size budget.
+model_dir = os.environ.get("WEATHER_MODEL_DIR", os.path.join("cache", "weather_models"))
+model_budget_bytes = int(float(os.environ.get("WEATHER_MODEL_BUDGET_MB", 512)) * 2 ** 20)
+# Models older than this are retrained from scratch
+max_model_age_days = int(os.environ.get("WEATHER_MODEL_MAX_AGE_DAYS", 30))
+# Epochs of fine-tuning on the newest days when a cached model is behind the data (0 disables)
+fine_tune_epochs = int(os.environ.get("WEATHER_MODEL_FINE_TUNE_EPOCHS", 3))
+fine_tune_days = int(os.environ.get("WEATHER_MODEL_FINE_TUNE_DAYS", 90))
+# Models kept loaded in memory
+memory_size = int(os.environ.get("WEATHER_MODEL_MEMORY", 16))
+
+
+def _entry_name(key):
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+class ModelRegistry:
+
+    def __init__(self, directory=None, budget_bytes=None, memory_size=memory_size):
+        self.directory = directory or model_dir
+        self.budget_bytes = budget_bytes or model_budget_bytes
+        self.memory_size = memory_size
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()
+        self._flight = SingleFlight()
+
+    def _path(self, key):
+        return os.path.join(self.directory, _entry_name(key))
+
+    def load(self, key):
+        # (model, scaler, meta) or None; marks the entry as recently used
+        name = _entry_name(key)
+        path = self._path(key)
+        with self._lock:
+            entry = self._loaded.get(name)
+            if entry is not None:
+                self._loaded.move_to_end(name)
+        if entry is None:
+            try:
+                with open(os.path.join(path, "meta.json")) as f:
+                    meta = json.load(f)
+                with open(os.path.join(path, "scaler.pkl"), "rb") as f:
+                    scaler = pickle.load(f)
+                from tensorflow.keras.models import load_model
+                model = load_model(os.path.join(path, "model.keras"))
+            except (FileNotFoundError, ValueError, OSError, pickle.UnpicklingError) as e:
+                if os.path.exists(path):
+                    print(f"Discarding unreadable weather model {path}: {e}")
+                    shutil.rmtree(path, ignore_errors=True)
+                return None
+            entry = (model, scaler, meta)
+            self._remember(name, entry)
+        try:
+            os.utime(os.path.join(path, "meta.json"))
+        except FileNotFoundError:
+            pass
+        return entry
+
+    def _remember(self, name, entry):
+        with self._lock:
+            self._loaded[name] = entry
+            self._loaded.move_to_end(name)
+            while len(self._loaded) > self.memory_size:
+                self._loaded.popitem(last=False)
+
+    def save(self, key, model, scaler, meta):
+        # Written to a temporary directory and swapped in, then the budget is enforced
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        work_dir = tempfile.mkdtemp(dir=self.directory, prefix=".model_")
+        try:
+            model.save(os.path.join(work_dir, "model.keras"))
+            with open(os.path.join(work_dir, "scaler.pkl"), "wb") as f:
+                pickle.dump(scaler, f)
+            with open(os.path.join(work_dir, "meta.json"), "w") as f:
+                json.dump({**meta, 'key': repr(key)}, f)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.replace(work_dir, path)
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        self._remember(_entry_name(key), (model, scaler, meta))
+        self.evict(keep=_entry_name(key))
+
+    def evict(self, keep=None):
+        # Delete least recently used models (by meta.json mtime) until under the budget,
+        # never the `keep` entry that was just saved
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or name == keep or not os.path.isdir(path):
+                continue
+            try:
+                used = os.stat(os.path.join(path, "meta.json")).st_mtime
+            except FileNotFoundError:
+                continue
+            entries.append((used, _dir_size(path), name, path))
+        total = sum(size for _, size, _, _ in entries)
+        if keep is not None:
+            total += _dir_size(os.path.join(self.directory, keep))
+        for used, size, name, path in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            print(f"Evicting weather model {name} ({size / 2 ** 20:.1f} MB)")
+            shutil.rmtree(path, ignore_errors=True)
+            with self._lock:
+                self._loaded.pop(name, None)
+            total -= size
+
+    def get(self, key, data_end, train, fine_tune):
+        # Cached model for key, trained through data_end. train() -> (model, scaler) builds
+        # one from scratch; fine_tune(model, scaler, since) -> model returns a copy updated on
+        # days after `since`, leaving the cached model untouched for requests still using it
+        return self._flight.do(key, lambda: self._get(key, data_end, train, fine_tune))
+
+    def _get(self, key, data_end, train, fine_tune):
+        today = datetime.date.today()
+        entry = self.load(key)
+        if entry is not None:
+            model, scaler, meta = entry
+            trained_at = datetime.date.fromisoformat(meta['trained_at'])
+            trained_through = datetime.date.fromisoformat(meta['trained_through'])
+            if (today - trained_at).days <= max_model_age_days:
+                if data_end <= trained_through or fine_tune_epochs <= 0:
+                    return model, scaler
+                model = fine_tune(model, scaler, trained_through)
+                self.save(key, model, scaler, {**meta, 'trained_through': data_end.isoformat()})
+                return model, scaler
+            print(f"Weather model {_entry_name(key)} trained {trained_at} is stale, retraining")
+
+        model, scaler = train()
+        self.save(key, model, scaler, {'trained_at': today.isoformat(), 'trained_through': data_end.isoformat()})
+        return model, scaler
+
+
+registry = ModelRegistry()
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from response_cache import SingleFlight
+from weather_client import fetch_ranges
+
+# Local archive of daily weather history in SQLite, keyed by grid cell and date. Points are
+# snapped to the weather model's grid, so nearby farms share one history, and a query only
+# downloads the days the archive does not hold yet.
+store_path = os.environ.get("WEATHER_STORE", os.path.join("cache", "weather.sqlite"))
+# Grid spacing in degrees (Open-Meteo's archive is about 0.1 degrees)
+grid_resolution = float(os.environ.get("WEATHER_GRID_RESOLUTION", 0.1))
+
+columns = ["temperature_2m_max", "temperature_2m_min", "precipitation_sum", "relative_humidity_2m_mean"]
+
+_fetches = SingleFlight()
+
+
+def connect(path=None):
+    path = path or store_path
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily (
+            cell_lat REAL NOT NULL,
+            cell_lon REAL NOT NULL,
+            date TEXT NOT NULL,
+            temperature_2m_max REAL,
+            temperature_2m_min REAL,
+            precipitation_sum REAL,
+            relative_humidity_2m_mean REAL,
+            PRIMARY KEY (cell_lat, cell_lon, date)
+        ) WITHOUT ROWID
+    """)
+    return conn
+
+
+def snap(lat, lon, resolution=None):
+    # Centre of the grid cell holding the point
+    resolution = resolution or grid_resolution
+    return (round(round(lat / resolution) * resolution, 4),
+            round(round(lon / resolution) * resolution, 4))
+
+
+def missing_spans(stored_dates, start, end):
+    # Contiguous [start, end] runs of days in the range that are not in stored_dates
+    days = pd.date_range(start, end, freq='D')
+    missing = days[~days.isin(pd.to_datetime(list(stored_dates)))]
+    if len(missing) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(missing.values).astype('timedelta64[D]') != np.timedelta64(1, 'D')) + 1
+    run_starts = np.r_[0, breaks]
+    run_ends = np.r_[breaks - 1, len(missing) - 1]
+    return [(missing[i].date(), missing[j].date()) for i, j in zip(run_starts, run_ends)]
+
+
+def daily_frame(chunks):
+    # The API's "daily" dicts as one DataFrame with a column per variable
+    frames = []
+    for daily in chunks:
+        if daily is None:
+            continue
+        if "relative_humidity_2m_mean" not in daily:
+            print("Humidity data not available")
+        frames.append(pd.DataFrame({
+            'date': daily["time"],
+            **{column: pd.to_numeric(pd.Series(daily.get(column, [None] * len(daily["time"]))),
+                                     errors='coerce') for column in columns},
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['date'] + columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _store(conn, cell, frame):
+    # Days with no values at all (the archive lags a few days behind) are left out, so
+    # they are fetched again next time
+    frame = frame.dropna(subset=columns, how='all')
+    if frame.empty:
+        return 0
+    rows = frame[['date'] + columns].astype(object).where(frame.notna(), None)
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO daily VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(cell[0], cell[1], *row) for row in rows.itertuples(index=False)])
+    return len(rows)
+
+
+def _sync(cell, start, end, min_interval):
+    conn = connect()
+    try:
+        stored = [row[0] for row in conn.execute(
+            "SELECT date FROM daily WHERE cell_lat = ? AND cell_lon = ? AND date BETWEEN ? AND ?",
+            (cell[0], cell[1], start.isoformat(), end.isoformat()))]
+        spans = missing_spans(stored, start, end)
+        if spans:
+            days = sum((span_end - span_start).days + 1 for span_start, span_end in spans)
+            print(f"Fetching {days} missing weather days for cell {cell} in {len(spans)} span(s)")
+            _store(conn, cell, daily_frame(fetch_ranges(cell[0], cell[1], spans, min_interval)))
+    finally:
+        conn.close()
+
+
+def get_daily(lat, lon, start, end, min_interval=0):
+    # Daily history for [start, end] at the point's grid cell: missing days are fetched and
+    # stored first, everything else comes from the archive
+    cell = snap(lat, lon)
+    # Concurrent queries for the same cell share one delta fetch
+    _fetches.do((cell, start, end), lambda: _sync(cell, start, end, min_interval))
+    conn = connect()
+    try:
+        return pd.read_sql_query(
+            "SELECT date, temperature_2m_max, temperature_2m_min, precipitation_sum, relative_humidity_2m_mean "
+            "FROM daily WHERE cell_lat = ? AND cell_lon = ? AND date BETWEEN ? AND ? ORDER BY date",
+            conn, params=(cell[0], cell[1], start.isoformat(), end.isoformat()))
+    finally:
+        conn.close()